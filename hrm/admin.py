@@ -1,6 +1,102 @@
+import csv
+
+from datetime import datetime
+
+from django.conf.urls import url
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.functional import cached_property
+
+from .export import Echo, export_rows
+from .models import Employee, EmployeeAlias, Hrm, VipMonthly, HrmMonthly
+
+
+def estimated_count(model, using='default'):
+    """Returns the number of rows in the model's table as estimated by the database.
+
+    Uses the row count ANALYZE stores in sqlite_stat1 or pg_class and otherwise counts
+    the rows. Loads delete and insert rows again, so the largest primary key is no estimate."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split(' ')[0])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+    return model._default_manager.using(using).count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts an unfiltered changelist with estimated_count instead of COUNT(*) once the
+    table has more than `threshold` rows. Filtered changelists are counted exactly."""
+
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate > self.threshold:
+                return estimate
+        return super().count
+
+
+class EmployeeValueListFilter(admin.SimpleListFilter):
+    """Filters on a field of the related employee with the choices read from Employee and
+    cached for `timeout` seconds instead of a DISTINCT over the join on every page."""
+
+    field = None
+    timeout = 300
+
+    def lookups(self, request, model_admin):
+        key = 'hrm.admin.employee_{}'.format(self.field)
+        values = cache.get(key)
+        if values is None:
+            values = list(Employee.objects.exclude(**{self.field: None}).order_by(
+                self.field).values_list(self.field, flat=True).distinct())
+            cache.set(key, values, self.timeout)
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value() is not None:
+            return queryset.filter(**{'employee__{}'.format(self.field): self.value()})
+        return queryset
+
+
+class LocationListFilter(EmployeeValueListFilter):
+    title = 'location'
+    parameter_name = 'location'
+    field = 'location'
 
-from .models import Employee, Hrm, VipMonthly, HrmMonthly
+
+class SubunitListFilter(EmployeeValueListFilter):
+    title = 'subunit'
+    parameter_name = 'subunit'
+    field = 'subunit'
+
+
+class EmployeeRelatedAdmin(admin.ModelAdmin):
+    """A changelist of rows of an employee, with the employee joined in the page query
+    and without the full count of the unfiltered table."""
+
+    list_select_related = ('employee', )
+    list_filter = (LocationListFilter, SubunitListFilter)
+    search_fields = ('employee__employee_number', 'employee__lastname',
+                     'employee__firstname')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Employee)
@@ -10,27 +106,50 @@ class EmployeeAdmin(admin.ModelAdmin):
     list_filter = ('location', 'subunit')
 
 
+@admin.register(EmployeeAlias)
+class EmployeeAliasAdmin(admin.ModelAdmin):
+    list_display = ('key', 'source', 'employee', 'created')
+    list_select_related = ('employee', )
+    search_fields = ('key', 'employee__employee_number', 'employee__lastname')
+    list_filter = ('source', )
+
+
 @admin.register(Hrm)
-class HrmAdmin(admin.ModelAdmin):
+class HrmAdmin(EmployeeRelatedAdmin):
     list_display = ('employee', 'hrm_balance', 'vip_balance',
                     'entitlements', 'pending_approval', 'scheduled',
                     'taken', 'available_balance')
-    search_fields = ('employee__employee_number', 'employee__lastname',
-                     'employee__firstname')
-    list_filter = ('employee__location', 'employee__subunit')
+
+    def get_urls(self):
+        urls = [
+            url(r'^export/$', self.admin_site.admin_view(self.export_view),
+                name='{}_{}_export'.format(self.model._meta.app_label, self.model._meta.model_name)),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        """Streams the HRM / VIP reconciliation as csv, optionally as of ?transaction_date=YYYY-MM-DD."""
+        transaction_date = request.GET.get('transaction_date')
+        if transaction_date:
+            try:
+                transaction_date = datetime.strptime(transaction_date, '%Y-%m-%d').date()
+            except ValueError:
+                return HttpResponseBadRequest('Invalid transaction_date. Expected YYYY-MM-DD.')
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in export_rows(transaction_date)), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="export_{}.csv"'.format(
+            datetime.today().strftime('%Y%m%d'))
+        return response
 
 
 @admin.register(HrmMonthly)
-class HrmMonthlyAdmin(admin.ModelAdmin):
-    list_display = ('employee', 'balance')
-    list_filter = ('employee__location', 'employee__subunit')
-    search_fields = ('employee__employee_number', 'employee__lastname',
-                     'employee__firstname')
+class HrmMonthlyAdmin(EmployeeRelatedAdmin):
+    list_display = ('employee', 'transaction_date', 'balance')
+    date_hierarchy = 'transaction_date'
 
 
 @admin.register(VipMonthly)
-class VipMonthlyAdmin(admin.ModelAdmin):
-    list_display = ('employee', 'balance')
-    list_filter = ('employee__location', 'employee__subunit')
-    search_fields = ('employee__employee_number', 'employee__lastname',
-                     'employee__firstname')
+class VipMonthlyAdmin(EmployeeRelatedAdmin):
+    list_display = ('employee', 'transaction_date', 'balance')
+    date_hierarchy = 'transaction_date'
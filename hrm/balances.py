@@ -0,0 +1,179 @@
+import numpy as np
+
+from decimal import Decimal, ROUND_HALF_UP
+from dateutil.relativedelta import relativedelta
+from django.db import connections, transaction
+from django.db.models import Sum
+
+from .models import Balances, Employee, Hrm, HrmMonthly, OpeningBalances, VipMonthly
+
+# amounts are held as integer hundredths of a day so the arrays are exact
+ACCRUAL = 208
+
+
+def to_cents(value):
+    return int((Decimal(value or 0) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class BalanceCube(object):
+    """Leave balances for employees x months from start_date to end_date.
+
+    Months are indexed by month end. Each employee accrues 2.08 days for every month
+    after their opening balance month in which they are employed and has HrmMonthly days
+    taken in those months deducted. Running totals are cumulative sums along the month axis.
+
+        cube = BalanceCube(date(2014, 12, 31), date(2015, 8, 31))
+        cube.write()
+
+    `employees` is an optional Employee queryset to limit the cube to.
+    """
+
+    def __init__(self, start_date, end_date, employees=None):
+        self.start_date = start_date + relativedelta(day=1)
+        self.end_date = end_date + relativedelta(day=31)
+        self.months = []
+        month = self.start_date + relativedelta(day=31)
+        while month <= self.end_date:
+            self.months.append(month)
+            month = month + relativedelta(months=1) + relativedelta(day=31)
+        self.queryset = Employee.objects.all() if employees is None else employees
+        self.employees = list(self.queryset.order_by('pk'))
+        self.index = {employee.pk: i for i, employee in enumerate(self.employees)}
+        shape = (len(self.employees), len(self.months))
+        self.opening = np.zeros(len(self.employees), dtype=np.int64)
+        self.opening_month = np.full(len(self.employees), -1, dtype=np.int64)
+        self.taken_monthly = np.zeros(shape, dtype=np.int64)
+        self.vip_balance = np.zeros(shape, dtype=np.int64)
+        self.load(self.queryset)
+        self.compute()
+
+    def month_index(self, value):
+        return (value.year - self.start_date.year) * 12 + value.month - self.start_date.month
+
+    def add(self, array, rows):
+        """Adds (employee_id, date, amount) rows that fall inside the cube to `array`."""
+        i, m, cents = [], [], []
+        for employee_id, value, amount in rows:
+            month = self.month_index(value)
+            if employee_id in self.index and 0 <= month < len(self.months):
+                i.append(self.index[employee_id])
+                m.append(month)
+                cents.append(to_cents(amount))
+        np.add.at(array, (np.array(i, dtype=np.int64), np.array(m, dtype=np.int64)),
+                  np.array(cents, dtype=np.int64))
+
+    def load(self, employees):
+        for opening_balance in OpeningBalances.objects.filter(
+                employee__in=employees).order_by('-pk').values_list('employee_id', 'balance_date', 'balance'):
+            employee_id, balance_date, balance = opening_balance
+            self.opening[self.index[employee_id]] = to_cents(balance)
+            self.opening_month[self.index[employee_id]] = max(self.month_index(balance_date), -1)
+        self.add(self.taken_monthly, HrmMonthly.objects.filter(employee__in=employees).values_list(
+            'employee_id', 'transaction_date').annotate(balance=Sum('balance')).order_by())
+        self.add(self.vip_balance, VipMonthly.objects.filter(employee__in=employees).values_list(
+            'employee_id', 'transaction_date').annotate(balance=Sum('balance')).order_by())
+
+    def compute(self):
+        months = np.arange(len(self.months))[None, :]
+        far = len(self.months)
+        joined = np.array([self.month_index(e.joined) for e in self.employees], dtype=np.int64)
+        terminated = np.array([self.month_index(e.termination_date) if e.termination_date else far
+                               for e in self.employees], dtype=np.int64)
+        self.employed = (months >= joined[:, None]) & (months <= terminated[:, None])
+        after_opening = months > self.opening_month[:, None]
+        self.accrued = np.cumsum(np.where(self.employed & after_opening, ACCRUAL, 0), axis=1)
+        self.taken = np.cumsum(np.where(after_opening, self.taken_monthly, 0), axis=1)
+        self.entitlement = self.opening[:, None] + self.accrued
+        self.balance = self.entitlement - self.taken
+
+    def balances(self, from_date=None):
+        """Yields unsaved Balances instances for each employed month from from_date onward."""
+        first = max(self.month_index(from_date), 0) if from_date else 0
+        for i, employee in enumerate(self.employees):
+            for m in np.nonzero(self.employed[i, first:])[0] + first:
+                yield Balances(
+                    employee=employee,
+                    joined=employee.joined,
+                    termination_date=employee.termination_date,
+                    balance_date=self.months[m],
+                    opening=to_decimal(self.opening[i]),
+                    accrued=to_decimal(self.accrued[i, m]),
+                    entitlement=to_decimal(self.entitlement[i, m]),
+                    taken=to_decimal(self.taken[i, m]),
+                    balance=to_decimal(self.balance[i, m]),
+                    vip_balance=to_decimal(self.vip_balance[i, m]),
+                )
+
+    def write(self, from_date=None):
+        """Replaces the Balances rows of these employees from from_date onward. Returns the rows written."""
+        from_date = from_date + relativedelta(day=31) if from_date else self.months[0]
+        balances = list(self.balances(from_date))
+        with transaction.atomic():
+            Balances.objects.filter(
+                employee__in=self.queryset,
+                balance_date__gte=from_date,
+                balance_date__lte=self.end_date).delete()
+            Balances.objects.bulk_create(balances)
+        return len(balances)
+
+
+def merge_dirty(*dirty):
+    """Merges the `dirty` dictionaries of several readers keeping the earliest month per employee."""
+    merged = {}
+    for d in dirty:
+        for employee_id, value in d.items():
+            if employee_id not in merged or value < merged[employee_id]:
+                merged[employee_id] = value
+    return merged
+
+
+def recompute(dirty, start_date, end_date, chunk_size=500):
+    """Rewrites Balances for the employees in `dirty`, a dictionary of {employee_id: earliest
+    changed month}, from that month onward, or from start_date if earlier, e.g. date.min for
+    opening balances. Use the same start_date as the full run.
+
+    Returns the number of rows written."""
+    by_month = {}
+    for employee_id, value in dirty.items():
+        by_month.setdefault(max(value, start_date), []).append(employee_id)
+    written = 0
+    for from_date, employee_ids in sorted(by_month.items()):
+        for i in range(0, len(employee_ids), chunk_size):
+            cube = BalanceCube(
+                start_date, end_date, Employee.objects.filter(pk__in=employee_ids[i:i + chunk_size]))
+            written += cube.write(from_date)
+    return written
+
+
+def refresh_vip_balances(queryset=None):
+    """Sets Hrm.vip_balance of the rows of `queryset`, by default all, to the sum of the
+    employee's VipMonthly and OpeningBalances balances with one UPDATE. Returns the number
+    of rows updated.
+
+    Loads replace the rows they loaded before, so the sum is taken again rather than
+    the balances loaded being added to vip_balance."""
+    queryset = Hrm.objects.all() if queryset is None else queryset
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    total = 'COALESCE((SELECT SUM(b.{balance}) FROM {table} b WHERE b.{employee} = {hrm}.{hrm_employee}), 0)'
+    totals = ' + '.join(total.format(
+        balance=quote(model._meta.get_field('balance').column),
+        table=quote(model._meta.db_table),
+        employee=quote(model._meta.get_field('employee').column),
+        hrm=quote(Hrm._meta.db_table),
+        hrm_employee=quote(Hrm._meta.get_field('employee').column)) for model in [VipMonthly, OpeningBalances])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE {hrm} SET {vip_balance} = {totals} WHERE {pk} IN ({sql})'.format(
+                hrm=quote(Hrm._meta.db_table),
+                vip_balance=quote(Hrm._meta.get_field('vip_balance').column),
+                totals=totals,
+                pk=quote(Hrm._meta.pk.column),
+                sql=sql),
+            params)
+        return cursor.rowcount
@@ -0,0 +1,132 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+from datetime import date, datetime
+
+import django
+
+from django.db import connection, transaction
+
+from .balances import BalanceCube
+from .instrumentation import QueryCounter
+from .load import (
+    employee_reader, opening_balances_reader, hrm_usage_readers, hrm_monthly_readers, vip_monthly_readers)
+from .resolver import EmployeeResolver
+from .summary import Summarize
+from .synthetic import SyntheticData
+
+
+class Step(object):
+    """Wall time, peak traced memory and queries of one benchmark step."""
+
+    def __init__(self, name, rows=0):
+        self.name = name
+        self.rows = rows
+        self.seconds = 0.0
+        self.peak_memory = 0
+        self.queries = 0
+        self.statements = {}
+
+    def __str__(self):
+        return '{}: {} rows in {:.2f}s, {} queries, peak {:.1f} MB'.format(
+            self.name, self.rows, self.seconds, self.queries, self.peak_memory / 1024 / 1024)
+
+    def as_dict(self):
+        return dict(name=self.name, rows=self.rows, seconds=round(self.seconds, 4),
+                    peak_memory=self.peak_memory, queries=self.queries, statements=self.statements)
+
+
+def measure(name, func, rows=0):
+    """Runs func and returns a Step and the result of func.
+
+    Memory is traced with tracemalloc, which slows the step down, so compare wall times
+    between runs rather than with untraced loads."""
+    step = Step(name, rows)
+    tracemalloc.start()
+    started = time.time()
+    try:
+        with QueryCounter() as queries:
+            result = func()
+    finally:
+        step.seconds = time.time() - started
+        step.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    step.queries = queries.count
+    step.statements = dict(queries.statements)
+    return step, result
+
+
+class Benchmark(object):
+    """Generates synthetic files of `rows` employees and leave list rows and times each reader
+    and summary step against the configured database.
+
+        Benchmark(10000, path='~/bench').run().save()
+
+    Steps run in one transaction that is rolled back, so the database is left as it was."""
+
+    def __init__(self, rows, path=None, seed=0, year=2015, month=8):
+        self.rows = rows
+        self.year = year
+        self.month = month
+        self.seed = seed
+        self.path = os.path.join(os.path.expanduser(path or '~/hrm_benchmark'), str(rows))
+        self.steps = []
+        self.started = None
+
+    def step(self, name, func, rows=0):
+        step, result = measure(name, func, rows)
+        self.steps.append(step)
+        print(step)
+        return result
+
+    def load(self, readers):
+        for reader in readers:
+            reader.load()
+        return readers
+
+    def run(self):
+        self.started = datetime.now()
+        self.steps = []
+        data = SyntheticData(self.rows, year=self.year, month=self.month, seed=self.seed)
+        self.step('generate', lambda: data.write(self.path), self.rows)
+        with transaction.atomic():
+            reader = employee_reader(self.path)
+            self.step('employees', reader.load, self.rows)
+            resolver = self.step('resolver', EmployeeResolver, self.rows)
+            reader = opening_balances_reader(self.path, resolver)
+            self.step('opening_balances', reader.load, self.rows)
+            readers = hrm_usage_readers(self.path, [(self.month, self.year)])
+            self.step('hrm_usage', lambda: self.load(readers), self.rows)
+            readers = hrm_monthly_readers(self.path, [(self.month, self.year)])
+            self.step('leave_list', lambda: self.load(readers), data.leave_rows)
+            readers = vip_monthly_readers(self.path, [(self.month, self.year)])
+            self.step('vip', lambda: self.load(readers), self.rows)
+            reference_date = date(self.year, self.month, 1)
+            self.step('summarize_all', lambda: Summarize.summarize_all(reference_date, data.opening_date),
+                      self.rows)
+            self.step('balances', lambda: BalanceCube(data.opening_date, reference_date).write(), self.rows)
+            transaction.set_rollback(True)
+        return self
+
+    def as_dict(self):
+        return dict(
+            rows=self.rows,
+            seed=self.seed,
+            started=self.started.isoformat() if self.started else None,
+            python=platform.python_version(),
+            django=django.get_version(),
+            database=connection.vendor,
+            steps=[step.as_dict() for step in self.steps],
+        )
+
+    def save(self, filename=None):
+        """Writes the results as JSON, by default to benchmark_<rows>_<started>.json in path,
+        and returns the filename."""
+        filename = filename or os.path.join(self.path, 'benchmark_{}_{}.json'.format(
+            self.rows, self.started.strftime('%Y%m%d%H%M%S')))
+        with open(os.path.expanduser(filename), 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        return filename
@@ -0,0 +1,86 @@
+from datetime import datetime
+from dateutil.parser import parse
+
+
+class DateParser(object):
+    """Parses the date strings of one file, detecting the file's format from the first rows.
+
+    The first `sample_size` values are parsed with dateutil and the formats that give the
+    same result on every sample are kept. Once detected, values are parsed with strptime
+    and dateutil is only used for values that do not match. Results are memoized per string.
+
+        dates = DateParser(dayfirst=True)
+        dates.parse('10/8/15')  # datetime(2015, 8, 10)
+    """
+
+    formats = [
+        '%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%d/%m/%y', '%m/%d/%Y', '%m/%d/%y',
+        '%d-%m-%Y', '%d-%m-%y', '%d %b %Y', '%d-%b-%y', '%d-%b-%Y', '%Y-%m-%d %H:%M:%S']
+    sample_size = 5
+
+    def __init__(self, dayfirst=False):
+        self.dayfirst = dayfirst
+        self.format = None
+        self.candidates = sorted(self.formats, key=self.ambiguous_order)
+        self.samples = 0
+        self.fallbacks = 0
+        self.cache = {}
+
+    def __call__(self, value):
+        return self.parse(value)
+
+    def parse(self, value):
+        try:
+            return self.cache[value]
+        except KeyError:
+            pass
+        result = None
+        if self.format:
+            try:
+                result = self.strptime(value.strip(), self.format)
+            except ValueError:
+                pass
+        if result is None:
+            result = parse(value, dayfirst=self.dayfirst)
+            if self.samples < self.sample_size:
+                self.detect(value.strip(), result)
+            else:
+                self.fallbacks += 1
+        self.cache[value] = result
+        return result
+
+    def detect(self, text, result):
+        candidates = []
+        for fmt in self.candidates:
+            try:
+                if self.strptime(text, fmt) == result:
+                    candidates.append(fmt)
+            except ValueError:
+                pass
+        self.candidates = candidates
+        self.samples += 1
+        if not self.candidates or self.samples >= self.sample_size:
+            self.format = (self.candidates or [None])[0]
+            self.samples = self.sample_size
+
+    def ambiguous_order(self, fmt):
+        """Sorts the formats that read the first number of an ambiguous date, e.g. 03/04/2015,
+        as the day or the month, by dayfirst so that samples matching both pick the right one."""
+        return fmt.startswith('%m' if self.dayfirst else '%d')
+
+    def strptime(self, text, fmt):
+        result = datetime.strptime(text, fmt)
+        if '%y' in fmt:
+            result = result.replace(year=self.convert_year(result.year % 100))
+        return result
+
+    @staticmethod
+    def convert_year(year):
+        """Returns the four digit year for a two digit year the way dateutil does."""
+        this_year = datetime.now().year
+        year += this_year // 100 * 100
+        if year >= this_year + 50:
+            year -= 100
+        elif year < this_year - 50:
+            year += 100
+        return year
@@ -4,47 +4,79 @@ import os
 from datetime import datetime
 from decimal import Decimal
 
-from .models import Hrm, Vip
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Func, Max, Q, Value, When
 
+from .models import Hrm, VipMonthly
 
-def export():
+HEADER = [
+    'employee_number', 'lastname', 'firstname', 'localtion', 'subunit', 'period',
+    'entitlements', 'pending_approval', 'scheduled', 'taken', 'available_balance',
+    'total_overdrawn', 'hrm', 'vip', 'diff', 'gr_in_hrm', 'gr_in_vip', 'excessive']
+
+EXCESSIVE = Decimal('4.16')
+
+
+class Echo(object):
+    """A file-like object that returns what is written, for streaming csv.writer rows."""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(transaction_date=None):
+    """Returns the reconciliation rows as one query joining Hrm, Employee and the
+    VipMonthly balance as of transaction_date, by default the latest, with the diff
+    columns computed in SQL."""
+    if not transaction_date:
+        transaction_date = VipMonthly.objects.aggregate(
+            transaction_date=Max('transaction_date'))['transaction_date']
+    decimal_field = DecimalField(max_digits=10, decimal_places=2)
+    vip = F('employee__vipmonthly__balance')
+    # compare columns to expressions rather than to literals, SQLite compares text bound
+    # Decimal parameters as greater than any number
+    excessive = Value(EXCESSIVE, output_field=decimal_field)
+    return Hrm.objects.filter(
+        employee__vipmonthly__transaction_date=transaction_date,
+    ).annotate(
+        diff=ExpressionWrapper(F('hrm_balance') - vip, output_field=decimal_field),
+    ).annotate(
+        abs_diff=Func(F('diff'), function='ABS', output_field=decimal_field),
+    ).annotate(
+        gr_in_hrm=Case(When(hrm_balance__gt=vip, then=F('abs_diff')), output_field=decimal_field),
+        gr_in_vip=Case(When(hrm_balance__lt=vip, then=F('abs_diff')), output_field=decimal_field),
+        excessive=Case(
+            When(Q(hrm_balance__gte=vip + excessive) | Q(hrm_balance__lte=vip - excessive), then=F('abs_diff')),
+            output_field=decimal_field),
+    ).values_list(
+        'employee__employee_number', 'employee__lastname', 'employee__firstname',
+        'employee__location', 'employee__subunit', 'leave_period_start', 'leave_period_end',
+        'entitlements', 'pending_approval', 'scheduled', 'taken', 'available_balance',
+        'total_overdrawn', 'hrm_balance', 'vip_balance', 'diff', 'gr_in_hrm', 'gr_in_vip', 'excessive',
+    )
+
+
+def export_rows(transaction_date=None):
+    """Yields the header and then each reconciliation row, streamed from the database."""
+    yield HEADER
+    for values in export_queryset(transaction_date).iterator():
+        values = list(values)
+        leave_period_start, leave_period_end = values[5:7]
+        values[5:7] = ['{} - {}'.format(
+            leave_period_start.strftime('%Y-%m-%d'), leave_period_end.strftime('%Y-%m-%d'))]
+        yield values
+
+
+def export(transaction_date=None, path=None):
     total = 0
     filename = 'export_{}.csv'.format(datetime.today().strftime('%Y%m%d'))
-    path = os.path.join(os.path.expanduser('~/'), filename)
-    with open(path, 'w', newline='') as csvfile:
+    path = os.path.join(os.path.expanduser(path or '~/'), filename)
+    with open(path, 'w', newline='', buffering=1024 * 1024) as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow([
-            'employee_number', 'lastname', 'firstname', 'localtion', 'subunit', 'period',
-            'entitlements', 'pending_approval', 'scheduled', 'taken', 'available_balance',
-            'total_overdrawn', 'hrm', 'vip', 'diff', 'gr_in_hrm', 'gr_in_vip', 'excessive'])
-        for vip in Vip.objects.all():
-            try:
-                hrm = Hrm.objects.get(employee=vip.employee)
-                writer.writerow([
-                    hrm.employee.employee_number,
-                    hrm.employee.lastname,
-                    hrm.employee.firstname,
-                    hrm.employee.location,
-                    hrm.employee.subunit,
-                    '{} - {}'.format(
-                        hrm.leave_period_start.strftime('%Y-%m-%d'),
-                        hrm.leave_period_end.strftime('%Y-%m-%d')
-                    ),
-                    hrm.entitlements,
-                    hrm.pending_approval,
-                    hrm.scheduled,
-                    hrm.taken,
-                    hrm.available_balance,
-                    hrm.total_overdrawn,
-                    hrm.hrm_balance,
-                    hrm.vip_balance,
-                    hrm.hrm_balance - vip.balance,
-                    abs(hrm.hrm_balance - vip.balance) if (hrm.hrm_balance - vip.balance) > 0 else None,
-                    abs(hrm.hrm_balance - vip.balance) if (hrm.hrm_balance - vip.balance) < 0 else None,
-                    abs(hrm.hrm_balance - vip.balance) if abs(hrm.hrm_balance - vip.balance) >= 4.16 else None,
-                ])
-                total += hrm.hrm_balance - (hrm.vip_balance or Decimal(0.00))
-            except Hrm.DoesNotExist:
-                pass
+        rows = export_rows(transaction_date)
+        writer.writerow(next(rows))
+        for row in rows:
+            writer.writerow(row)
+            total += row[12] - (row[13] or Decimal(0.00))
     print('total={}'.format(total))
     print('Exported to {}'.format(path))
+    return path
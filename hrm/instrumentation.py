@@ -0,0 +1,177 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class CountingCursor(object):
+    """Wraps a cursor and counts each statement executed on it."""
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def execute(self, sql, params=None):
+        self.counter.add(sql)
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.counter.add(sql)
+        return self.cursor.executemany(sql, param_list)
+
+
+class QueryCounter(object):
+    """Counts the queries run on a connection while in the block, whether or not DEBUG is on.
+
+        with QueryCounter() as queries:
+            reader.load()
+        print(queries.count, queries.statements['INSERT'])
+
+    Wraps the cursors returned by connection.make_cursor and make_debug_cursor, so the
+    queries Django logs with DEBUG on are still logged."""
+
+    wrapped = ('make_cursor', 'make_debug_cursor')
+
+    def __init__(self, using=None):
+        self.connection = connections[using or DEFAULT_DB_ALIAS]
+        self.count = 0
+        self.statements = Counter()
+        self.saved = {}
+
+    def add(self, sql):
+        self.count += 1
+        self.statements[sql.lstrip().split(' ', 1)[0].upper()] += 1
+
+    def wrap(self, make_cursor):
+        def wrapper(cursor):
+            return CountingCursor(make_cursor(cursor), self)
+        return wrapper
+
+    def __enter__(self):
+        for name in self.wrapped:
+            self.saved[name] = self.connection.__dict__.get(name)
+            setattr(self.connection, name, self.wrap(getattr(self.connection, name)))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for name in self.wrapped:
+            if self.saved[name] is None:
+                delattr(self.connection, name)
+            else:
+                setattr(self.connection, name, self.saved[name])
+
+
+class LoadReport(object):
+    """Time and queries per stage and row counts of one reader load, returned by BaseReader.load.
+
+        report = reader.load(profile=True, log='~/hrm_load.jsonl')
+        print(report)
+        report.stages['load_process']['seconds'], report.rows_unresolved, report.result
+
+    Stages are timed with `stage`, which may be nested, e.g. 'write' within 'load_process'.
+    `result` is what post_load returned."""
+
+    counters = ('rows_read', 'rows_skipped', 'rows_unresolved', 'rows_written')
+    profile_lines = 30
+
+    def __init__(self, reader):
+        self.reader = reader.__class__.__name__
+        self.filename = reader.filename
+        self.source = reader.source
+        self.started = time.time()
+        self.stages = OrderedDict()
+        self.result = None
+        self.profile = None
+        self.depth = 0
+        for counter in self.counters:
+            setattr(self, counter, 0)
+
+    def __str__(self):
+        lines = ['{} {}: {} read, {} skipped, {} unresolved, {} written'.format(
+            self.reader, self.filename or '', self.rows_read, self.rows_skipped, self.rows_unresolved,
+            self.rows_written)]
+        for name, stage in self.stages.items():
+            lines.append('  {}: {:.3f}s, {} queries'.format(name, stage['seconds'], stage['queries']))
+        return '\n'.join(lines)
+
+    @property
+    def seconds(self):
+        return sum(stage['seconds'] for stage in self.stages.values() if stage['top'])
+
+    @property
+    def queries(self):
+        return sum(stage['queries'] for stage in self.stages.values() if stage['top'])
+
+    @contextmanager
+    def stage(self, name):
+        """Adds the time and queries of the block to stage `name`."""
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'queries': 0, 'top': not self.depth})
+        self.depth += 1
+        started = time.perf_counter()
+        try:
+            with QueryCounter() as queries:
+                yield stage
+        finally:
+            self.depth -= 1
+            stage['seconds'] += time.perf_counter() - started
+            stage['queries'] += queries.count
+
+    @contextmanager
+    def profiling(self, enabled=True):
+        """Profiles the block with cProfile, if enabled, keeping the top functions by
+        cumulative time as text in `profile`."""
+        if not enabled:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.profile_lines)
+            self.profile = stream.getvalue()
+
+    def count(self, reader):
+        """Copies the row counters from the reader."""
+        for counter in self.counters:
+            setattr(self, counter, getattr(reader, counter))
+
+    def as_dict(self):
+        result = self.result if isinstance(self.result, (int, float, str, type(None))) else str(self.result)
+        return OrderedDict(
+            [('reader', self.reader), ('filename', self.filename), ('source', self.source),
+             ('started', self.started), ('seconds', round(self.seconds, 4)), ('queries', self.queries)] +
+            [(counter, getattr(self, counter)) for counter in self.counters] +
+            [('stages', OrderedDict((name, {'seconds': round(stage['seconds'], 4), 'queries': stage['queries']})
+                                    for name, stage in self.stages.items())),
+             ('result', result), ('profile', self.profile)])
+
+    def log(self, f):
+        """Appends the report as one JSON line to f, a path or a file-like object."""
+        line = json.dumps(self.as_dict()) + '\n'
+        if hasattr(f, 'write'):
+            f.write(line)
+        else:
+            with open(os.path.expanduser(f), 'a') as f:
+                f.write(line)
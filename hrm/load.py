@@ -1,61 +1,225 @@
 import os
+import time
 
+from collections import OrderedDict
 from datetime import datetime
 
+from .balances import merge_dirty
+from .parallel import load_parallel, stage_all
 from .readers import (
     EmployeeReader, HrmUsageReportReader, VipMonthlyReader, HrmMonthlyReader, OpeningBalancesReader)
+from .registry import changed, register
+from .resolver import EmployeeResolver
 from hrm.summary import Summarize
 
 PERIODS = [(12, 2014), (1, 2015), (2, 2015), (3, 2015), (4, 2015), (5, 2015), (6, 2015), (7, 2015), (8, 2015)]
 DEFAULT_PATH = '~/Downloads/leave/'
 
 
-def load_employee(path=None):
-    path = path or DEFAULT_PATH
-    csvfile = os.path.join(path, 'employee.csv')
-    reader = EmployeeReader(csvfile)
-    return reader.load()
+class StageResult(object):
+    """Rows processed and time taken by one stage of a load."""
+
+    def __init__(self, name, rows=0, elapsed=0.0, result=None):
+        self.name = name
+        self.rows = rows
+        self.elapsed = elapsed
+        self.result = result
+
+    def __repr__(self):
+        return '{}({!r}, rows={!r}, elapsed={:.3f})'.format(
+            self.__class__.__name__, self.name, self.rows, self.elapsed)
+
+    def __str__(self):
+        return '{}: {} rows in {:.2f}s ({:.0f} rows/s)'.format(
+            self.name, self.rows, self.elapsed, self.rows_per_second)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class LoadResult(object):
+    """The stages of a load_all run in the order they finished."""
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.readers = []
+        self.started = time.time()
+        self.elapsed = 0.0
+
+    def __str__(self):
+        lines = [str(stage) for stage in self.stages.values()]
+        lines.append('total: {} rows in {:.2f}s'.format(self.rows, self.elapsed))
+        return '\n'.join(lines)
+
+    @property
+    def rows(self):
+        return sum(stage.rows for stage in self.stages.values())
 
+    @property
+    def reports(self):
+        return [reader.report for reader in self.readers]
 
-def load_hrm_usage(path):
+    @property
+    def dirty(self):
+        """The earliest month changed per employee id over all readers, see balances.recompute."""
+        return merge_dirty(*[reader.dirty for reader in self.readers])
+
+    def add(self, name, readers, elapsed, result=None):
+        stage = StageResult(name, sum(reader.rows_read for reader in readers), elapsed, result)
+        self.stages[name] = stage
+        self.readers.extend(readers)
+        self.elapsed = time.time() - self.started
+        print(stage)
+        return stage
+
+
+def employee_reader(path=None, sync=False):
     path = path or DEFAULT_PATH
-    for m, y in [(8, 2015)]:
-        csvfile = os.path.join(path, 'hrm_usage{0}{1:02d}.csv'.format(y, m))
-        print(csvfile)
-        hrm_reader = HrmUsageReportReader(csvfile, m, y)
-        hrm_reader.load()
+    return EmployeeReader(os.path.join(path, 'employee.csv'), sync=sync)
 
 
-def load_opening_balances(path):
+def opening_balances_reader(path=None, resolver=None):
     path = path or DEFAULT_PATH
     csvfile = os.path.join(path, 'opening201412.csv')
-    print(csvfile)
-    reader = OpeningBalancesReader(csvfile, datetime.today().date())
-    reader.load()
+    return OpeningBalancesReader(csvfile, datetime.today().date(), resolver=resolver)
+
+
+def hrm_usage_readers(path=None, periods=None, delta=False):
+    path = path or DEFAULT_PATH
+    return [HrmUsageReportReader(os.path.join(path, 'hrm_usage{0}{1:02d}.csv'.format(y, m)), m, y, delta=delta)
+            for m, y in periods or [(8, 2015)]]
 
 
-def load_vip_monthly(path=None):
+def hrm_monthly_readers(path=None, periods=None):
     path = path or DEFAULT_PATH
-    for m, y in PERIODS:
-        csvfile = os.path.join(path, 'vip{0}{1:02d}.csv'.format(y, m))
-        print(csvfile)
-        reader = VipMonthlyReader(csvfile, m, y)
-        reader.load()
-
-
-def load_hrm_monthly(path, y, m):
-    csvfile = os.path.join(path, 'leave_list{0}{1:02d}.csv'.format(y, m))
-    print(csvfile)
-    reader = HrmMonthlyReader(csvfile)
-    reader.load()
-
-
-def load_all(path, y, m):
-    e = load_employee(path)
-    o = load_opening_balances(path)
-    h = load_hrm_usage(path)
-    hm = load_hrm_monthly(path, y, m)
-    vm = load_vip_monthly(path)
-    # summarize = Summarize(path)
-    # summarize.monthly()
-    # print('Employees: {}, Usage: {}Hrm:{}, Vip:{}'.format(e, h, hm, vm))
+    return [HrmMonthlyReader(os.path.join(path, 'leave_list{0}{1:02d}.csv'.format(y, m)), month=m, year=y)
+            for m, y in periods]
+
+
+def vip_monthly_readers(path=None, periods=None):
+    path = path or DEFAULT_PATH
+    return [VipMonthlyReader(os.path.join(path, 'vip{0}{1:02d}.csv'.format(y, m)), m, y)
+            for m, y in periods or PERIODS]
+
+
+def load_readers(readers, resolver=None, jobs=1, checkpoint=None, force=False, use_staging_table=False):
+    """Loads readers one after another or, if jobs is not 1, parses them in parallel
+    with parallel.load_parallel. Returns the readers.
+
+    Readers of files unchanged since they were last loaded are skipped unless `force`,
+    see registry.changed.
+
+    If `checkpoint` is set, readers commit every `checkpoint` rows and resume an
+    interrupted load of the same file, see BaseReader.open_journal. Parallel loads write
+    each file in one go and are not checkpointed, so a checkpoint requires jobs=1.
+
+    If `use_staging_table` is set, readers that support it load into a staging table and publish
+    the rows in one transaction at the end, see staging.StagingTable."""
+    if checkpoint and jobs != 1:
+        raise ValueError('Checkpointed loads run one reader after another. Got jobs={}.'.format(jobs))
+    pending = changed(readers, force)
+    for reader, _ in pending:
+        reader.use_staging_table = use_staging_table
+        print(reader.filename)
+    if jobs == 1:
+        for reader, _ in pending:
+            if resolver:
+                reader.resolver = resolver
+            if checkpoint:
+                reader.checkpoint = checkpoint
+            reader.load()
+    else:
+        load_parallel([reader for reader, _ in pending], jobs, resolver)
+    register(pending)
+    return readers
+
+
+def load_employee(path=None, sync=False):
+    reader = employee_reader(path, sync)
+    return reader.load()
+
+
+def load_hrm_usage(path, resolver=None, periods=None, jobs=1, checkpoint=None, force=False, delta=False,
+                   use_staging_table=False):
+    """Loads the HRM usage reports of periods. With `delta` only rows that differ from
+    those loaded are written, see HrmUsageReportReader.write_delta."""
+    return load_readers(hrm_usage_readers(path, periods, delta), resolver, jobs, checkpoint, force, use_staging_table)
+
+
+def load_opening_balances(path, resolver=None, checkpoint=None, force=False):
+    return load_readers([opening_balances_reader(path, resolver)], checkpoint=checkpoint, force=force)[0]
+
+
+def load_vip_monthly(path=None, resolver=None, periods=None, jobs=1, checkpoint=None, force=False,
+                     use_staging_table=False):
+    return load_readers(
+        vip_monthly_readers(path, periods), resolver or EmployeeResolver(), jobs, checkpoint, force, use_staging_table)
+
+
+def load_hrm_monthly(path, y=None, m=None, resolver=None, periods=None, jobs=1, checkpoint=None, force=False,
+                     use_staging_table=False):
+    return load_readers(
+        hrm_monthly_readers(path, periods or [(m, y)]), resolver, jobs, checkpoint, force, use_staging_table)
+
+
+def load_changed(readers, force=False, log=None):
+    """Loads, one after another, the readers of files changed since they were last loaded
+    and returns them."""
+    pending = changed(readers, force)
+    for reader, _ in pending:
+        reader.load(log=log)
+    register(pending)
+    return [reader for reader, _ in pending]
+
+
+def load_all(path, y, m, jobs=1, sync=False, log=None, force=False, use_staging_table=False):
+    """Loads all sources and returns a LoadResult.
+
+    Employees are loaded first and then opening balances, which may add employees. The
+    HRM usage, leave list and VIP files are then parsed and resolved together in `jobs`
+    processes and written one after another from this process. The wall-clock time of
+    parsing them is shared among those sources in proportion to the time each file took.
+
+    Files unchanged since they were last loaded are skipped unless `force`, see
+    registry.changed. A file loaded again replaces the rows it loaded before. Reloading
+    employees without `sync` deletes every row that refers to them, so all other files
+    are then loaded.
+
+    If `use_staging_table` is set, the HRM usage, leave list and VIP rows are loaded into staging
+    tables and published one file at a time in short transactions, see staging.StagingTable.
+
+    If `log` is a path or a file-like object each reader's LoadReport is appended to it
+    as a JSON line."""
+    result = LoadResult()
+    started = time.time()
+    readers = load_changed([employee_reader(path, sync)], force, log)
+    force = force or bool(readers and not sync)
+    result.add('employees', readers, time.time() - started, readers[0].report.result if readers else None)
+    started = time.time()
+    resolver = EmployeeResolver()
+    readers = load_changed([opening_balances_reader(path, resolver)], force, log)
+    result.add('opening_balances', readers, time.time() - started)
+    pending = OrderedDict([
+        ('hrm_usage', changed(hrm_usage_readers(path), force)),
+        ('leave_list', changed(hrm_monthly_readers(path, [(m, y)]), force)),
+    ])
+    pending['vip'] = changed(vip_monthly_readers(path), force)
+    readers = [reader for source_pending in pending.values() for reader, _ in source_pending]
+    for reader in readers:
+        reader.use_staging_table = use_staging_table
+    started = time.time()
+    staged = dict(zip(readers, stage_all(readers, jobs, resolver)))
+    stage_elapsed = time.time() - started
+    busy = sum(seconds for _, _, seconds in staged.values())
+    for name, source_pending in pending.items():
+        elapsed = 0.0
+        for reader, _ in source_pending:
+            rows, state, seconds = staged[reader]
+            reader.restore_stage_state(state)
+            started = time.time()
+            reader.load_staged(rows, log=log)
+            elapsed += time.time() - started + (stage_elapsed * seconds / busy if busy else 0.0)
+        register(source_pending)
+        result.add(name, [reader for reader, _ in source_pending], elapsed)
+    return result
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from hrm.benchmark import Benchmark
+from hrm.synthetic import SIZES
+
+
+class Command(BaseCommand):
+
+    help = ('Times each reader and summary step on synthetic files and saves wall time, '
+            'peak memory and query counts as JSON. The database is left unchanged.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=SIZES[:2],
+                            help='Employees and leave list rows per run. Default: {}'.format(SIZES[:2]))
+        parser.add_argument('--path', default='~/hrm_benchmark',
+                            help='Folder for the synthetic files and results.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic data.')
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            benchmark = Benchmark(rows, path=options['path'], seed=options['seed']).run()
+            self.stdout.write('Saved {}'.format(benchmark.save()))
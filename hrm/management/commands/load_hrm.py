@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from hrm.load import DEFAULT_PATH, load_all
+
+
+class Command(BaseCommand):
+
+    help = 'Loads the employee, opening balance, HRM usage, leave list and VIP export files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH,
+                            help='Folder of export files. Default: {}'.format(DEFAULT_PATH))
+        parser.add_argument('--year', type=int, default=2015, help='Year of the leave list to load.')
+        parser.add_argument('--month', type=int, default=8, help='Month of the leave list to load.')
+        parser.add_argument('--jobs', type=int, default=1,
+                            help='Processes used to parse the HRM usage, leave list and VIP files.')
+        parser.add_argument('--sync', action='store_true', default=False,
+                            help='Sync employees instead of deleting and reloading them.')
+        parser.add_argument('--log', default=None,
+                            help='File to append a JSON line of load metrics per reader to.')
+        parser.add_argument('--force', action='store_true', default=False,
+                            help='Load files even if unchanged since they were last loaded.')
+        parser.add_argument('--staging', action='store_true', default=False,
+                            help='Load into staging tables and publish each file in one short transaction.')
+
+    def handle(self, *args, **options):
+        result = load_all(
+            options['path'], options['year'], options['month'], jobs=options['jobs'], sync=options['sync'],
+            log=options['log'], force=options['force'], use_staging_table=options['staging'])
+        self.stdout.write('Loaded {} rows in {:.2f}s.'.format(result.rows, result.elapsed))
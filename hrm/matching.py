@@ -0,0 +1,132 @@
+import re
+
+from collections import Counter
+
+from .models import Employee
+
+SOUNDEX_CODES = dict(
+    [(c, '1') for c in 'bfpv'] + [(c, '2') for c in 'cgjkqsxz'] + [(c, '3') for c in 'dt'] +
+    [('l', '4')] + [(c, '5') for c in 'mn'] + [('r', '6')])
+
+
+def normalize(name):
+    """Returns the name lower case with anything but letters removed."""
+    return re.sub('[^a-z]', '', (name or '').lower())
+
+
+def soundex(name):
+    """Returns the American Soundex code of a name, e.g. Robert -> R163."""
+    name = normalize(name)
+    if not name:
+        return ''
+    code = name[0].upper()
+    previous = SOUNDEX_CODES.get(name[0])
+    for c in name[1:]:
+        digit = SOUNDEX_CODES.get(c)
+        if digit and digit != previous:
+            code += digit
+        if c not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def trigrams(name):
+    name = '  {} '.format(normalize(name))
+    return set(name[i:i + 3] for i in range(0, len(name) - 2))
+
+
+def levenshtein(a, b):
+    """Returns the edit distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class Match(object):
+
+    def __init__(self, employee, score):
+        self.employee = employee
+        self.score = score
+
+    def __repr__(self):
+        return '{}({!r}, {:.2f})'.format(self.__class__.__name__, self.employee, self.score)
+
+
+class NameMatcher(object):
+    """Matches names to employees in memory.
+
+    Candidates are blocked by the Soundex code and the trigrams of the normalized surname,
+    then scored from 0 to 1 by surname edit distance and, if given, the first initial.
+
+        matcher = NameMatcher()
+        matcher.match('Brueford', 'B')  # [Match(<Employee: Bruford, Bill (153) >, 0.93)]
+    """
+
+    threshold = 0.8
+    ambiguous_margin = 0.05
+    learn_margin = 0.15
+
+    def __init__(self, employees=None, threshold=None):
+        self.threshold = threshold or self.threshold
+        self.employees = list(Employee.objects.all() if employees is None else employees)
+        self.lastnames = [normalize(employee.lastname) for employee in self.employees]
+        self.by_soundex = {}
+        self.by_trigram = {}
+        for i, employee in enumerate(self.employees):
+            self.by_soundex.setdefault(soundex(employee.lastname), set()).add(i)
+            for trigram in trigrams(employee.lastname):
+                self.by_trigram.setdefault(trigram, set()).add(i)
+
+    def candidates(self, lastname):
+        """Returns the indexes of employees sharing the Soundex code or enough trigrams."""
+        candidates = set(self.by_soundex.get(soundex(lastname), set()))
+        query = trigrams(lastname)
+        shared = Counter()
+        for trigram in query:
+            shared.update(self.by_trigram.get(trigram, ()))
+        minimum = max(1, len(query) // 3)
+        candidates.update(i for i, count in shared.items() if count >= minimum)
+        return candidates
+
+    def score(self, lastname, firstname, i):
+        candidate = self.lastnames[i]
+        score = 1 - levenshtein(lastname, candidate) / max(len(lastname), len(candidate))
+        if len(lastname) > 3 and lastname in candidate:
+            score = max(score, 0.9)
+        if firstname:
+            if normalize(self.employees[i].firstname)[:1] == firstname[:1]:
+                score = 0.8 * score + 0.2
+            else:
+                score = 0.8 * score
+        return score
+
+    def match(self, lastname, firstname=None):
+        """Returns a list of Match, best first, scoring at least the threshold."""
+        lastname, firstname = normalize(lastname), normalize(firstname)
+        if not lastname:
+            return []
+        matches = [Match(self.employees[i], self.score(lastname, firstname, i))
+                   for i in self.candidates(lastname)]
+        matches = [match for match in matches if match.score >= self.threshold]
+        return sorted(matches, key=lambda match: (-match.score, match.employee.employee_number))
+
+    def ambiguous(self, matches):
+        """Returns True if more than one match scores close to the best."""
+        return len(matches) > 1 and matches[0].score - matches[1].score < self.ambiguous_margin
+
+    def confident(self, matches):
+        """Returns True if there is one match or the best scores at least learn_margin above
+        the next, i.e. clear enough to be saved as an alias."""
+        return len(matches) == 1 or matches[0].score - matches[1].score >= self.learn_margin
+
+    def best(self, lastname, firstname=None):
+        """Returns the best matching employee and the matches, or None if none or ambiguous."""
+        matches = self.match(lastname, firstname)
+        employee = matches[0].employee if matches and not self.ambiguous(matches) else None
+        return employee, matches
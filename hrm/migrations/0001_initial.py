@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from decimal import Decimal
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Balances',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('joined', models.DateField()),
+                ('termination_date', models.DateField(null=True)),
+                ('balance_date', models.DateField()),
+                ('opening', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('accrued', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('entitlement', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('taken', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('balance', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('vip_balance', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+            ],
+            options={
+                'verbose_name': 'Calculated Balances',
+                'ordering': ('employee__lastname', 'balance_date'),
+            },
+        ),
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('employee_number', models.IntegerField(unique=True)),
+                ('firstname', models.CharField(max_length=100)),
+                ('lastname', models.CharField(max_length=100)),
+                ('middlename', models.CharField(max_length=100, null=True)),
+                ('subunit', models.CharField(max_length=100, null=True)),
+                ('location', models.CharField(max_length=100, null=True)),
+                ('job_title', models.CharField(max_length=100, null=True)),
+                ('employment_status', models.CharField(max_length=100, null=True)),
+                ('joined', models.DateField()),
+                ('termination_date', models.DateField(null=True)),
+                ('strippedname', models.CharField(max_length=100, null=True)),
+                ('manually_added', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ('lastname',),
+            },
+        ),
+        migrations.CreateModel(
+            name='EmployeeAlias',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('source', models.CharField(max_length=25, choices=[('hrm_usage', 'HRM Usage Report'), ('leave_list', 'HRM Leave List'), ('vip', 'VIP'), ('payroll', 'Payroll')])),
+                ('key', models.CharField(max_length=100)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(to='hrm.Employee')),
+            ],
+            options={
+                'verbose_name': 'Employee Alias',
+                'verbose_name_plural': 'Employee Aliases',
+                'ordering': ('source', 'key'),
+            },
+        ),
+        migrations.CreateModel(
+            name='Hrm',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('fullname', models.CharField(max_length=100)),
+                ('leave_period_start', models.DateField()),
+                ('leave_period_end', models.DateField()),
+                ('entitlements', models.DecimalField(max_digits=10, decimal_places=2)),
+                ('pending_approval', models.DecimalField(max_digits=10, decimal_places=2)),
+                ('scheduled', models.DecimalField(max_digits=10, decimal_places=2)),
+                ('taken', models.DecimalField(max_digits=10, decimal_places=2)),
+                ('available_balance', models.DecimalField(max_digits=10, decimal_places=2)),
+                ('total_overdrawn', models.DecimalField(max_digits=10, decimal_places=2)),
+                ('hrm_balance', models.DecimalField(default=Decimal('0.00'), max_digits=10, decimal_places=2)),
+                ('vip_balance', models.DecimalField(default=Decimal('0.00'), max_digits=10, decimal_places=2)),
+                ('employee', models.ForeignKey(to='hrm.Employee')),
+            ],
+            options={
+                'verbose_name': 'HRM Usage Report',
+                'ordering': ('employee__lastname',),
+            },
+        ),
+        migrations.CreateModel(
+            name='HrmMonthly',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('employee_number', models.CharField(max_length=100)),
+                ('fullname', models.CharField(max_length=100)),
+                ('transaction_date', models.DateField()),
+                ('leave_period_start', models.DateField()),
+                ('leave_period_end', models.DateField()),
+                ('entitlements', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('pending_approval', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('scheduled', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('taken', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('available_balance', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('total_overdrawn', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('balance', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('status', models.CharField(max_length=50)),
+                ('employee', models.ForeignKey(to='hrm.Employee')),
+            ],
+            options={
+                'verbose_name': 'HRM Monthly Balances',
+                'ordering': ('employee__lastname',),
+            },
+        ),
+        migrations.CreateModel(
+            name='OpeningBalances',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('balance', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('balance_date', models.DateField()),
+                ('employee', models.ForeignKey(to='hrm.Employee')),
+            ],
+            options={
+                'verbose_name': 'Opening Balances',
+                'ordering': ('employee__lastname',),
+            },
+        ),
+        migrations.CreateModel(
+            name='VipMonthly',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('employee_number', models.CharField(max_length=100)),
+                ('fullname', models.CharField(max_length=100)),
+                ('transaction_date', models.DateField()),
+                ('leave_period_start', models.DateField()),
+                ('leave_period_end', models.DateField()),
+                ('entitlements', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('pending_approval', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('scheduled', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('taken', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('available_balance', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('total_overdrawn', models.DecimalField(null=True, max_digits=10, decimal_places=2)),
+                ('balance', models.DecimalField(default=Decimal('0'), max_digits=10, decimal_places=2)),
+                ('employee', models.ForeignKey(to='hrm.Employee')),
+            ],
+            options={
+                'verbose_name': 'VIP Monthly Balances',
+                'ordering': ('employee__lastname',),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='employee',
+            unique_together=set([('firstname', 'lastname')]),
+        ),
+        migrations.AddField(
+            model_name='balances',
+            name='employee',
+            field=models.ForeignKey(to='hrm.Employee'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hrmmonthly',
+            unique_together=set([('employee', 'transaction_date', 'leave_period_start', 'leave_period_end', 'status')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='employeealias',
+            unique_together=set([('source', 'key')]),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employee',
+            name='joined',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='strippedname',
+            field=models.CharField(max_length=100, null=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='termination_date',
+            field=models.DateField(null=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='hrmmonthly',
+            name='transaction_date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='vipmonthly',
+            name='transaction_date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='hrm',
+            index_together=set([('leave_period_start', 'leave_period_end')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='hrmmonthly',
+            index_together=set([('employee', 'leave_period_start', 'leave_period_end', 'transaction_date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='vipmonthly',
+            index_together=set([('employee', 'leave_period_start', 'leave_period_end', 'transaction_date')]),
+        ),
+    ]
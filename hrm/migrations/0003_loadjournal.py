@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrm', '0002_reader_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoadJournal',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('reader', models.CharField(max_length=50)),
+                ('filename', models.CharField(max_length=255)),
+                ('key', models.CharField(max_length=25, default='')),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('rows_committed', models.IntegerField(default=0)),
+                ('status', models.CharField(max_length=10, default='running', choices=[('running', 'Running'), ('complete', 'Complete')])),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Load Journal',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='loadjournal',
+            unique_together=set([('reader', 'filename', 'key')]),
+        ),
+    ]
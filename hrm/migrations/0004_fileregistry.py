@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrm', '0003_loadjournal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileRegistry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('reader', models.CharField(max_length=50)),
+                ('filename', models.CharField(max_length=255)),
+                ('key', models.CharField(max_length=25, default='')),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('rows_read', models.IntegerField(default=0)),
+                ('rows_written', models.IntegerField(default=0)),
+                ('result', models.TextField(blank=True, help_text='The LoadReport of the last load as JSON.')),
+                ('loaded', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'File Registry',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='fileregistry',
+            unique_together=set([('reader', 'filename', 'key')]),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# a copy of hrm.status as of this migration, so later changes to it do not change the backfill
+COMPONENTS = {
+    'Pending Approval': 'pending_approval',
+    'Scheduled': 'scheduled',
+    'Taken': 'taken',
+}
+LABEL = re.compile(r'([A-Za-z][\w -]*?)\s*\(\s*(-?\d+(?:\.\d+)?)\s*\)')
+
+
+def parse_status(status):
+    days = {field: Decimal('0') for field in COMPONENTS.values()}
+    for label, value in LABEL.findall(status or ''):
+        label = ' '.join(label.split())
+        if label in COMPONENTS:
+            days[COMPONENTS[label]] += Decimal(value)
+    return days
+
+
+def backfill_status_components(apps, schema_editor):
+    """Sets the pending approval, scheduled and taken days of existing rows from their
+    status, with one update per distinct status.
+
+    The readers did not keep the status before this migration, so rows they loaded have
+    an empty status and are left as they are, with no components. Load their leave lists
+    again, e.g. with `manage.py load_hrm --force`, to set them."""
+    HrmMonthly = apps.get_model('hrm', 'HrmMonthly')
+    statuses = HrmMonthly.objects.exclude(status='').order_by().values_list('status', flat=True).distinct()
+    for status in list(statuses):
+        HrmMonthly.objects.filter(status=status).update(**parse_status(status))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrm', '0004_fileregistry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hrmmonthly',
+            name='status',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterIndexTogether(
+            name='hrmmonthly',
+            index_together=set([('pending_approval',), ('employee', 'leave_period_start', 'leave_period_end', 'transaction_date'), ('taken',), ('scheduled',)]),
+        ),
+        migrations.RunPython(backfill_status_components, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrm', '0005_hrmmonthly_status_components'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hrm',
+            name='report_month',
+            field=models.DateField(null=True, db_index=True, help_text='First day of the month of the usage report the row was loaded from'),
+        ),
+    ]
@@ -43,13 +43,14 @@ class Employee(models.Model):
         null=True
     )
 
-    joined = models.DateField()
+    joined = models.DateField(db_index=True)
 
-    termination_date = models.DateField(null=True)
+    termination_date = models.DateField(null=True, db_index=True)
 
     strippedname = models.CharField(
         max_length=100,
-        null=True
+        null=True,
+        db_index=True
     )
 
     manually_added = models.BooleanField(default=False)
@@ -72,6 +73,41 @@ class Employee(models.Model):
         ordering = ('lastname', )
 
 
+class EmployeeAlias(models.Model):
+    """A name as spelled in a source file, normalized by resolver.alias_key, that is
+    known to refer to an employee."""
+
+    SOURCES = (
+        ('hrm_usage', 'HRM Usage Report'),
+        ('leave_list', 'HRM Leave List'),
+        ('vip', 'VIP'),
+        ('payroll', 'Payroll'),
+    )
+
+    source = models.CharField(
+        max_length=25,
+        choices=SOURCES
+    )
+
+    key = models.CharField(
+        max_length=100
+    )
+
+    employee = models.ForeignKey(Employee)
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{}: {} -> {}'.format(self.source, self.key, self.employee)
+
+    class Meta:
+        app_label = 'hrm'
+        unique_together = (('source', 'key'), )
+        ordering = ('source', 'key')
+        verbose_name = 'Employee Alias'
+        verbose_name_plural = 'Employee Aliases'
+
+
 class Hrm(models.Model):
 
     employee = models.ForeignKey(Employee)
@@ -126,9 +162,16 @@ class Hrm(models.Model):
         default=Decimal('0.00')
     )
 
+    report_month = models.DateField(
+        null=True,
+        db_index=True,
+        help_text='First day of the month of the usage report the row was loaded from'
+    )
+
     class Meta:
         app_label = 'hrm'
         ordering = ('employee__lastname', )
+        index_together = (('leave_period_start', 'leave_period_end'), )
         verbose_name = 'HRM Usage Report'
 
 
@@ -144,7 +187,7 @@ class BaseMonthly(models.Model):
         max_length=100
     )
 
-    transaction_date = models.DateField()
+    transaction_date = models.DateField(db_index=True)
 
     leave_period_start = models.DateField()
 
@@ -198,12 +241,15 @@ class BaseMonthly(models.Model):
 
 class HrmMonthly(BaseMonthly):
 
-    status = models.CharField(max_length=50)
+    status = models.CharField(max_length=100)
 
     class Meta:
         app_label = 'hrm'
         ordering = ('employee__lastname', )
         unique_together = ('employee', 'transaction_date', 'leave_period_start', 'leave_period_end', 'status')
+        index_together = (
+            ('employee', 'leave_period_start', 'leave_period_end', 'transaction_date'),
+            ('pending_approval', ), ('scheduled', ), ('taken', ))
         verbose_name = 'HRM Monthly Balances'
 
 
@@ -212,6 +258,7 @@ class VipMonthly(BaseMonthly):
     class Meta:
         app_label = 'hrm'
         ordering = ('employee__lastname', )
+        index_together = (('employee', 'leave_period_start', 'leave_period_end', 'transaction_date'), )
         verbose_name = 'VIP Monthly Balances'
 
 
@@ -241,6 +288,8 @@ class Balances(models.Model):
 
     termination_date = models.DateField(null=True)
 
+    balance_date = models.DateField()
+
     opening = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -279,5 +328,97 @@ class Balances(models.Model):
 
     class Meta:
         app_label = 'hrm'
-        ordering = ('employee__lastname', )
+        ordering = ('employee__lastname', 'balance_date')
         verbose_name = 'Calculated Balances'
+
+
+class LoadJournal(models.Model):
+    """The rows of a file committed by a checkpointed reader load, so an interrupted
+    load resumes after them. The file is identified by its path, size and mtime.
+
+    A complete journal does not stop the file being loaded again, in full, see FileRegistry."""
+
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+
+    reader = models.CharField(
+        max_length=50
+    )
+
+    filename = models.CharField(
+        max_length=255
+    )
+
+    key = models.CharField(
+        max_length=25,
+        default=''
+    )
+
+    size = models.BigIntegerField()
+
+    mtime = models.FloatField()
+
+    rows_committed = models.IntegerField(default=0)
+
+    status = models.CharField(
+        max_length=10,
+        choices=((RUNNING, 'Running'), (COMPLETE, 'Complete')),
+        default=RUNNING
+    )
+
+    started = models.DateTimeField(auto_now_add=True)
+
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} {} {}: {} rows {}'.format(self.reader, self.filename, self.key, self.rows_committed, self.status)
+
+    class Meta:
+        app_label = 'hrm'
+        unique_together = (('reader', 'filename', 'key'), )
+        verbose_name = 'Load Journal'
+
+
+class FileRegistry(models.Model):
+    """The fingerprint of the file last loaded by a reader for a key, e.g. the period, and
+    the result of that load, so unchanged files are not loaded again, see registry.changed."""
+
+    reader = models.CharField(
+        max_length=50
+    )
+
+    filename = models.CharField(
+        max_length=255
+    )
+
+    key = models.CharField(
+        max_length=25,
+        default=''
+    )
+
+    size = models.BigIntegerField()
+
+    mtime = models.FloatField()
+
+    sha256 = models.CharField(
+        max_length=64
+    )
+
+    rows_read = models.IntegerField(default=0)
+
+    rows_written = models.IntegerField(default=0)
+
+    result = models.TextField(
+        blank=True,
+        help_text='The LoadReport of the last load as JSON.'
+    )
+
+    loaded = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} {} {}: {} rows read'.format(self.reader, self.filename, self.key, self.rows_read)
+
+    class Meta:
+        app_label = 'hrm'
+        unique_together = (('reader', 'filename', 'key'), )
+        verbose_name = 'File Registry'
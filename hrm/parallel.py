@@ -0,0 +1,44 @@
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .resolver import EmployeeResolver
+
+
+def stage(reader):
+    """Stages a reader's file. Runs in a worker process so must not touch the database.
+
+    Returns the staged rows, the reader's stage_state() and the seconds taken."""
+    started = time.time()
+    staged = reader.stage()
+    return staged, reader.stage_state(), time.time() - started
+
+
+def stage_all(readers, jobs=None, resolver=None):
+    """Returns a list of (staged rows, state, seconds) per reader, parsed in a pool of `jobs` processes.
+
+    Readers share one resolver, with its aliases loaded here, so workers resolve employees
+    without querying.
+    With jobs=1 the files are staged in this process."""
+    resolver = resolver or EmployeeResolver()
+    resolver.load_aliases()
+    for reader in readers:
+        reader.resolver = resolver
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(readers) < 2:
+        return [stage(reader) for reader in readers]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(readers))) as executor:
+        return list(executor.map(stage, readers))
+
+
+def load_parallel(readers, jobs=None, resolver=None):
+    """Loads readers, parsing and resolving their files in parallel and writing the staged
+    rows from this process one reader at a time, in order, since SQLite has one writer.
+
+    Returns a list of each reader's LoadReport."""
+    results = []
+    for reader, (staged, state, _) in zip(readers, stage_all(readers, jobs, resolver)):
+        reader.restore_stage_state(state)
+        results.append(reader.load_staged(staged))
+    return results
@@ -1,40 +1,166 @@
 import csv
 import os
+import time
 
-from datetime import date, timedelta
+from itertools import islice
+
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
-from dateutil.parser import parse
 
 from django.db.utils import IntegrityError
 from django.db import transaction
+from django.db.models import Min
 
-from .models import Hrm, VipMonthly, HrmMonthly, Employee
+from .balances import refresh_vip_balances
+from .dates import DateParser
+from .instrumentation import LoadReport
+from .matching import NameMatcher
+from .models import Hrm, VipMonthly, HrmMonthly, Employee, LoadJournal
+from .resolver import EmployeeResolver
+from .staging import StagingTable
+from .status import FIELDS as STATUS_FIELDS, add_status, parse_status
+from .utils import MAX_PARAMS, bulk_update
 from hrm.models import OpeningBalances
-from django.core.exceptions import MultipleObjectsReturned
 
 
 class BaseReader(object):
 
     encoding = 'latin-1'
     model = None
+    source = None
+    dayfirst = False
+    profile = False
+    checkpoint = None
+    use_staging_table = False
 
-    def __init__(self, filename, delimiter=None, file_object=None):
+    def __init__(self, filename, delimiter=None, file_object=None, resolver=None):
         self.file_object = file_object
+        self._resolver = resolver
+        self.journal = None
+        self.resume_from = 0
+        self.dirty = {}
+        self.rows_read = 0
+        self.rows_skipped = 0
+        self.rows_unresolved = 0
+        self.rows_written = 0
+        self.dates = DateParser(dayfirst=self.dayfirst)
         try:
             self.filename = os.path.expanduser(filename)
-        except AttributeError:
+        except (AttributeError, TypeError):
             self.filename = None
         self.delimiter = ','
+        self.report = LoadReport(self)
 
-    def load(self):
-        self.pre_load()
-        if self.file_object:
-            self.load_process(self.file_object)
-        else:
-            with open(self.filename, encoding=self.encoding, newline='') as f:
-                self.load_process(f)
-        return self.post_load()
+    @property
+    def resolver(self):
+        """Returns the employee resolver, building it on first use."""
+        if self._resolver is None:
+            self._resolver = EmployeeResolver()
+        return self._resolver
+
+    @resolver.setter
+    def resolver(self, resolver):
+        self._resolver = resolver
+
+    def mark_dirty(self, employee_id, value):
+        """Records that the Balances of the employee changed as of the month of `value`.
+
+        `dirty` keeps the earliest month changed per employee id, see balances.recompute."""
+        value = value + relativedelta(day=1)
+        if isinstance(value, datetime):
+            value = value.date()
+        if employee_id not in self.dirty or value < self.dirty[employee_id]:
+            self.dirty[employee_id] = value
+
+    def load(self, profile=None, log=None):
+        """Loads the file and returns a LoadReport of the time and queries of each stage
+        and the rows read, skipped, unresolved and written. The report's `result` is the
+        value returned by post_load.
+
+        If `profile` is True the load is profiled with cProfile. If `log` is a path or a
+        file-like object the report is appended to it as a JSON line."""
+        self.report = LoadReport(self)
+        with self.report.profiling(self.profile if profile is None else profile):
+            self.open_journal()
+            if not self.resume_from:
+                with self.timed('pre_load'):
+                    self.pre_load()
+            with self.timed('load_process'):
+                if self.file_object:
+                    self.load_process(self.file_object)
+                else:
+                    with open(self.filename, encoding=self.encoding, newline='') as f:
+                        self.load_process(f)
+            self.close_journal()
+            with self.timed('post_load'):
+                self.report.result = self.post_load()
+        return self.finish_report(log)
+
+    def journal_key(self):
+        """Returns what, besides the file, identifies a load in LoadJournal, e.g. the period."""
+        return ''
+
+    def open_journal(self):
+        """If `checkpoint` is set, gets the LoadJournal of the file and sets `resume_from` to
+        the rows already committed by a load of the same file that did not complete.
+
+        Checkpointed readers commit every `checkpoint` rows together with the journal, so
+        an interrupted load resumes after the last chunk committed instead of re-applying it.
+        Staged loads publish all rows in one transaction so are not checkpointed.
+
+        The journal only covers a load interrupted part way through a file. Once a load
+        completes, loading the file again reloads it in full; registry.changed is what
+        skips files loaded before."""
+        self.journal = None
+        self.resume_from = 0
+        if not self.checkpoint or self.use_staging_table or not self.filename or self.file_object:
+            return
+        stat = os.stat(self.filename)
+        journal, created = LoadJournal.objects.get_or_create(
+            reader=self.__class__.__name__, filename=self.filename, key=self.journal_key(),
+            defaults={'size': stat.st_size, 'mtime': stat.st_mtime})
+        if (not created and journal.status == LoadJournal.RUNNING and
+                (journal.size, journal.mtime) == (stat.st_size, stat.st_mtime)):
+            self.resume_from = journal.rows_committed
+            print('Resuming {} from row {}.'.format(self.filename, self.resume_from))
+        elif not created:
+            journal.size, journal.mtime = stat.st_size, stat.st_mtime
+            journal.rows_committed = 0
+            journal.status = LoadJournal.RUNNING
+            journal.save()
+        self.journal = journal
+
+    def save_journal(self):
+        """Records the rows read so far as committed. Call in the transaction that writes them."""
+        if self.journal:
+            self.journal.rows_committed = self.resume_from + self.rows_read
+            self.journal.save(update_fields=['rows_committed', 'updated'])
+
+    def close_journal(self):
+        if self.journal:
+            self.journal.status = LoadJournal.COMPLETE
+            self.journal.rows_committed = self.resume_from + self.rows_read
+            self.journal.save()
+
+    def data_reader(self, f):
+        """Returns a csv reader of the data rows after the header and any rows already committed."""
+        reader = csv.reader(f, delimiter=self.delimiter)
+        next(reader, None)
+        if self.resume_from:
+            next(islice(reader, self.resume_from, self.resume_from), None)
+        return reader
+
+    def timed(self, name):
+        """Returns a context manager that adds the time and queries of the block to the report."""
+        return self.report.stage(name)
+
+    def finish_report(self, log=None):
+        self.report.count(self)
+        if log:
+            self.report.log(log)
+        return self.report
 
     def pre_load(self):
         self.model.objects.all().delete()
@@ -43,21 +169,61 @@ class BaseReader(object):
         """Override to update the model from the file-like object."""
         pass
 
+    def stage(self):
+        """Returns the rows of the file parsed and resolved but not written.
+
+        Does not query the database if the reader was given a resolver so it may run in
+        another process, see parallel.load_parallel. Write the result with load_staged."""
+        self.report = LoadReport(self)
+        with self.timed('stage_process'):
+            if self.file_object:
+                return self.stage_process(self.file_object)
+            with open(self.filename, encoding=self.encoding, newline='') as f:
+                return self.stage_process(f)
+
+    def stage_state(self):
+        """Returns the attributes set by stage() that a worker process hands back with the rows."""
+        return {'dirty': self.dirty, 'rows_read': self.rows_read, 'rows_skipped': self.rows_skipped,
+                'rows_unresolved': self.rows_unresolved, 'report': self.report}
+
+    def restore_stage_state(self, state):
+        """Sets the attributes returned by stage_state, e.g. of a copy of the reader staged in a worker process."""
+        self.dirty = state['dirty']
+        self.rows_read = state['rows_read']
+        self.rows_skipped = state['rows_skipped']
+        self.rows_unresolved = state['rows_unresolved']
+        self.report = state['report']
+
+    def load_staged(self, staged, log=None):
+        """Writes rows returned by stage() as load() would have. Returns the LoadReport
+        with the stage_process stage of stage() and the stages of the write."""
+        with self.timed('pre_load'):
+            self.pre_load()
+        with self.timed('write_staged'):
+            self.write_staged(staged)
+        with self.timed('post_load'):
+            self.report.result = self.post_load()
+        return self.finish_report(log)
+
+    def stage_process(self, f):
+        """Override to return the rows parsed from the file-like object without writing them."""
+        pass
+
+    def write_staged(self, staged):
+        """Override to write the rows returned by stage_process."""
+        pass
+
     def post_load(self):
         return self.model.objects.all().count()
 
-    def employee(self, firstname, middlename, lastname, strippedname):
-        try:
-            employee = Employee.objects.get(
-                lastname=lastname, firstname=firstname, middlename=middlename)
-        except Employee.DoesNotExist:
-            try:
-                employee = Employee.objects.get(
-                    strippedname=strippedname)
-            except Employee.DoesNotExist:
-                employee = None
-                print('Employee in {} not found. Got {} {} {}.'.format(
-                    self.model._meta.verbose_name, firstname, middlename, lastname))
+    def employee(self, firstname, middlename, lastname, strippedname, name=None):
+        """Returns the employee learned for `name` in this source or else by name, or None."""
+        employee = (self.resolver.alias(self.source, name) or
+                    self.resolver.name(lastname, firstname, middlename, strippedname))
+        if not employee:
+            self.rows_unresolved += 1
+            print('Employee in {} not found. Got {} {} {}.'.format(
+                self.model._meta.verbose_name, firstname, middlename, lastname))
         return employee
 
     def names(self, values):
@@ -79,111 +245,343 @@ class BaseReader(object):
 class HrmUsageReportReader(BaseReader):
     """Loads 'Leave Entitlement and Usage Report' csv export file.
 
-        Calculates a leave days balance, hrm_balance, as of the time of the report.
+        Calculates a leave days balance, hrm_balance, as of the time of the report, and
+        sets vip_balance from the VIP balances loaded, see balances.refresh_vip_balances.
+
+        Rows are written in chunks of `batch_size`, one bulk insert per chunk, or of
+        `checkpoint` rows committed with the LoadJournal if set.
+
+        Rows are stored with the report month, `month` and `year`, and a load replaces the
+        rows of its report month, see report_rows, so reloading a month does not add its
+        rows again and loading another month keeps those of the months loaded before.
+
+        With `delta=True` existing rows are kept and the file is diffed against them
+        by employee and leave period instead, see write_delta.
+
+        With `use_staging_table=True`, unless in delta mode, rows are loaded into a TEMP
+        table that replaces the rows of the report month in one short transaction at the
+        end, see write_staging_table.
         """
     model = Hrm
+    source = 'hrm_usage'
+    batch_size = 500
+    delta_fields = ['fullname', 'entitlements', 'pending_approval', 'scheduled', 'taken', 'available_balance',
+                    'total_overdrawn', 'hrm_balance']
 
-    def __init__(self, filename, month, year, delimiter=None):
+    def __init__(self, filename, month, year, delimiter=None, file_object=None, resolver=None,
+                 batch_size=None, delta=False):
         self.period_start = date(year, month, 1)
         self.period_end = (self.period_start + relativedelta(months=+1)) - timedelta(days=1)
-        super().__init__(filename, delimiter)
+        self.batch_size = batch_size or self.batch_size
+        self.delta = delta
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.elapsed = 0.0
+        super().__init__(filename, delimiter, file_object, resolver)
 
     def pre_load(self):
-        self.model.objects.filter(
-            leave_period_start=self.period_start,
-            leave_period_end=self.period_end,
-        ).delete()
+        if not self.delta and not self.use_staging_table:
+            self.report_rows().delete()
+
+    def report_rows(self):
+        """Returns the existing rows loaded from a report of the same month."""
+        return self.model.objects.filter(report_month=self.period_start)
+
+    def journal_key(self):
+        return self.period_start.isoformat()
+
+    def open_journal(self):
+        """Does not checkpoint in delta mode as the delta is written in one transaction."""
+        if self.delta:
+            self.journal = None
+            self.resume_from = 0
+        else:
+            super().open_journal()
 
     def hrm_balance(self, hrm):
         return hrm.entitlements - (hrm.pending_approval + hrm.scheduled + hrm.taken)
 
+    @property
+    def rows_per_second(self):
+        return self.rows_written / self.elapsed if self.elapsed else 0.0
+
     def load_process(self, f):
-        reader = csv.reader(f, delimiter=self.delimiter)
-        header = next(reader)
-        header = [h.lower() for h in header]
-        for values in reader:
+        self.write_staged(self.rows(f))
+
+    def stage_process(self, f):
+        return list(self.rows(f))
+
+    def write_staged(self, rows):
+        started = time.time()
+        if self.delta:
+            self.write_delta(rows)
+        elif self.use_staging_table:
+            self.write_staging_table(rows)
+        else:
+            self.write_batches(rows)
+        refresh_vip_balances(self.report_rows())
+        self.elapsed = time.time() - started
+        if not self.delta and not self.use_staging_table:
+            print('Loaded {} rows into {} in {:.2f}s ({:.0f} rows/s).'.format(
+                self.rows_written, self.model._meta.verbose_name, self.elapsed, self.rows_per_second))
+
+    def write_batches(self, rows):
+        batch_size = self.checkpoint or self.batch_size
+        batch = []
+        for hrm in rows:
+            batch.append(hrm)
+            if len(batch) >= batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+
+    def rows(self, f):
+        """Yields an unsaved Hrm instance for each row with a known employee."""
+        for values in self.data_reader(f):
+            self.rows_read += 1
             firstname, middlename, lastname, strippedname = self.names(values[0].split(' '))
-            employee = self.employee(firstname, middlename, lastname, strippedname)
+            employee = self.employee(firstname, middlename, lastname, strippedname, values[0])
             if employee:
-                hrm = Hrm(
+                yield Hrm(
                     employee=employee,
                     fullname=values[0],
-                    leave_period_start=parse(values[1].split('-')[1]),
-                    leave_period_end=parse(values[1].split('-')[0]),
+                    leave_period_start=self.dates.parse(values[1].split('-')[1]).date(),
+                    leave_period_end=self.dates.parse(values[1].split('-')[0]).date(),
                     entitlements=Decimal(values[2]),
                     pending_approval=Decimal(values[3]),
                     scheduled=Decimal(values[4]),
                     taken=Decimal(values[5]),
                     available_balance=Decimal(values[6]),
                     total_overdrawn=Decimal(values[7]),
+                    report_month=self.period_start,
                 )
-                hrm.hrm_balance = self.hrm_balance(hrm)
-                hrm.save()
+
+    def write_delta(self, rows):
+        """Bulk inserts new rows, bulk updates changed fields and deletes rows no longer in
+        the file, in one transaction.
+
+        Rows are keyed by employee and leave period. Existing rows are those of
+        report_rows."""
+        rows = list(rows)
+        existing = {}
+        for hrm in self.report_rows().select_related('employee').order_by('pk'):
+            key = (hrm.employee_id, hrm.leave_period_start, hrm.leave_period_end)
+            if key in existing:
+                self.deleted.append(hrm)
+            else:
+                existing[key] = hrm
+        seen = set()
+        changed_fields = set()
+        for hrm in rows:
+            hrm.hrm_balance = self.hrm_balance(hrm)
+            key = (hrm.employee.pk, hrm.leave_period_start, hrm.leave_period_end)
+            if key in seen:
+                self.rows_skipped += 1
+                print('Duplicate row in {} for {}. Got {}.'.format(
+                    self.model._meta.verbose_name, hrm.employee, hrm.fullname))
+                continue
+            seen.add(key)
+            old = existing.get(key)
+            if not old:
+                self.created.append(hrm)
+                continue
+            fields = [field for field in self.delta_fields if getattr(old, field) != getattr(hrm, field)]
+            if fields:
+                for field in fields:
+                    setattr(old, field, getattr(hrm, field))
+                changed_fields.update(fields)
+                self.updated.append(old)
+        for key, hrm in existing.items():
+            if key not in seen:
+                self.deleted.append(hrm)
+        with self.timed('write'), transaction.atomic():
+            self.model.objects.bulk_create(self.created, batch_size=self.batch_size)
+            bulk_update(self.updated, [field for field in self.delta_fields if field in changed_fields])
+            pks = [hrm.pk for hrm in self.deleted]
+            for i in range(0, len(pks), MAX_PARAMS):
+                self.model.objects.filter(pk__in=pks[i:i + MAX_PARAMS]).delete()
+        self.rows_written += len(self.created) + len(self.updated)
+        print('Applied {} delta: {} created, {} updated, {} deleted.'.format(
+            self.model._meta.verbose_name, len(self.created), len(self.updated), len(self.deleted)))
+
+    def write_staging_table(self, rows):
+        """Bulk loads the rows into a StagingTable, checks the rows and balances staged and
+        then replaces the existing rows of the report month, see report_rows, with them
+        in one transaction."""
+        rows = list(rows)
+        for hrm in rows:
+            hrm.hrm_balance = self.hrm_balance(hrm)
+        with StagingTable(self.model) as staging:
+            with self.timed('staging_table'):
+                staging.insert(rows)
+                staging.validate(len(rows), {
+                    field: sum(getattr(hrm, field) for hrm in rows) for field in ['entitlements', 'hrm_balance']})
+            with self.timed('write'), transaction.atomic():
+                self.report_rows().delete()
+                self.rows_written += staging.publish()
+        print('Published {} rows into {}.'.format(self.rows_written, self.model._meta.verbose_name))
+
+    def write_batch(self, batch):
+        """Sets hrm_balance on each instance and writes the chunk in one transaction."""
+        for hrm in batch:
+            hrm.hrm_balance = self.hrm_balance(hrm)
+        with self.timed('write'), transaction.atomic():
+            self.model.objects.bulk_create(batch)
+            self.save_journal()
+        self.rows_written += len(batch)
 
 
 class EmployeeReader(BaseReader):
+    """Loads the HRM employee list export file.
+
+    With `sync=True` existing employees are kept and the file is diffed against them
+    by employee_number instead of deleting and re-creating every employee."""
 
     model = Employee
+    sync_fields = ['lastname', 'firstname', 'middlename', 'subunit', 'location', 'job_title',
+                   'employment_status', 'joined', 'termination_date', 'strippedname']
+
+    def __init__(self, filename, delimiter=None, file_object=None, resolver=None, sync=False):
+        self.sync = sync
+        self.created = []
+        self.updated = []
+        self.terminated = []
+        self.missing = []
+        super().__init__(filename, delimiter, file_object, resolver)
+
+    def pre_load(self):
+        if not self.sync:
+            super().pre_load()
 
     def load_process(self, f):
+        if self.sync:
+            return self.sync_process(f)
         reader = csv.reader(f, delimiter=self.delimiter)
         header = next(reader)
         header = [h.lower() for h in header]
         for values in reader:
+            self.rows_read += 1
             with transaction.atomic():
                 try:
-                    firstname, middlename, lastname, strippedname = self.names(
-                        [values[2]] + values[1].replace('  ', ' ').split(' ')
-                    )
-                    Employee.objects.create(
-                        employee_number=str(int(values[0])),
-                        lastname=lastname,
-                        firstname=firstname,
-                        middlename=middlename,
-                        subunit=str(values[6]),
-                        location=str(values[7]),
-                        job_title=str(values[3]),
-                        employment_status=str(values[4]),
-                        joined=parse(values[5]),
-                        termination_date=parse(values[8]) if values[8] else None,
-                        strippedname=strippedname,
-                    )
+                    options = self.employee_options(values)
+                    Employee.objects.create(**options)
+                    self.rows_written += 1
                 except IntegrityError as e:
-                    print('Duplicate employee {} {} {}. Got {}.'.format(firstname, middlename, lastname, str(e)))
+                    self.rows_skipped += 1
+                    print('Duplicate employee {firstname} {middlename} {lastname}. Got {error}.'.format(
+                        error=str(e), **options))
 
-    def verify_employees(self, number, name):
+    def employee_options(self, values):
+        firstname, middlename, lastname, strippedname = self.names(
+            [values[2]] + values[1].replace('  ', ' ').split(' ')
+        )
+        return dict(
+            employee_number=int(values[0]),
+            lastname=lastname,
+            firstname=firstname,
+            middlename=middlename,
+            subunit=str(values[6]),
+            location=str(values[7]),
+            job_title=str(values[3]),
+            employment_status=str(values[4]),
+            joined=self.dates.parse(values[5]).date(),
+            termination_date=self.dates.parse(values[8]).date() if values[8] else None,
+            strippedname=strippedname,
+        )
+
+    def sync_process(self, f):
+        """Bulk inserts new employees, bulk updates changed fields and records terminations."""
+        existing = {employee.employee_number: employee for employee in Employee.objects.all()}
+        names = {(employee.firstname, employee.lastname): employee.employee_number
+                 for employee in existing.values()}
+        seen = set()
+        changed_fields = set()
+        reader = csv.reader(f, delimiter=self.delimiter)
+        next(reader)
+        for values in reader:
+            self.rows_read += 1
+            options = self.employee_options(values)
+            employee_number = options['employee_number']
+            name = (options['firstname'], options['lastname'])
+            if employee_number in seen or names.get(name, employee_number) != employee_number:
+                self.rows_skipped += 1
+                print('Duplicate employee {firstname} {middlename} {lastname}. Got {employee_number}.'.format(
+                    **options))
+                continue
+            seen.add(employee_number)
+            employee = existing.get(employee_number)
+            if not employee:
+                names[name] = employee_number
+                self.created.append(Employee(**options))
+                continue
+            fields = [field for field in self.sync_fields if getattr(employee, field) != options[field]]
+            if fields:
+                if not employee.termination_date and options['termination_date']:
+                    self.terminated.append(employee)
+                names.pop((employee.firstname, employee.lastname), None)
+                names[name] = employee_number
+                for field in fields:
+                    setattr(employee, field, options[field])
+                changed_fields.update(fields)
+                self.updated.append(employee)
+        self.missing = [employee for employee_number, employee in existing.items()
+                        if employee_number not in seen and not employee.manually_added]
+        with self.timed('write'), transaction.atomic():
+            Employee.objects.bulk_create(self.created)
+            bulk_update(self.updated, [field for field in self.sync_fields if field in changed_fields])
+        self.rows_written += len(self.created) + len(self.updated)
+        print('Synced {}: {} created, {} updated, {} terminated, {} not in file.'.format(
+            self.model._meta.verbose_name, len(self.created), len(self.updated),
+            len(self.terminated), len(self.missing)))
+
+    def verify_employees(self, number, name, source=None):
         if self.file_object:
-            missing = self.verify_file(self.file_object, number, name)
+            missing = self.verify_file(self.file_object, number, name, source)
         else:
             with open(self.filename, encoding=self.encoding, newline='') as f:
-                missing = self.verify_file(f, number, name)
+                missing = self.verify_file(f, number, name, source)
         return missing
 
-    def verify_file(self, f, number, name):
-        """Returns a dictionary of employees list in the file but not in Employees."""
+    def verify_file(self, f, number, name, source=None):
+        """Returns a dictionary of employees list in the file but not in Employees.
+
+        Names that do not match the employee number exactly are looked up with a NameMatcher
+        and reported as soft matches with the best candidates and their scores.
+
+        If `source` is given, names already learned for the employee number are accepted
+        and a soft match whose only or clearly best candidate, see NameMatcher.confident, is
+        the employee with that number is saved as an EmployeeAlias of the source."""
         missing = {}
         soft_match = {}
+        matcher = NameMatcher(self.resolver.by_number.values())
         reader = csv.reader(f, delimiter=self.delimiter)
         next(reader)
         for values in reader:
             lastname = [v for v in values[name].split(' ') if v][-1:][0]
             employee_number = int(values[number])
-            try:
-                Employee.objects.get(employee_number=employee_number, lastname=lastname)
-            except Employee.DoesNotExist:
-                try:
-                    employee = Employee.objects.get(lastname__icontains=lastname)
-                    option = Employee.objects.get(employee_number=employee_number)
-                    soft_match.update(
-                        {values[number]: [
-                            values[name],
-                            '{} {} {}'.format(employee.employee_number, employee.lastname, employee.firstname),
-                            '{} {} {}'.format(option.employee_number, option.lastname, option.firstname)]}
-                    )
-                    print('Soft match:{} {}'.format(values[number], soft_match.get(values[number])))
-                except Employee.DoesNotExist:
-                    missing.update({values[number]: values[name]})
-                    print('Employee not found. Got {}: {}'.format(employee_number, lastname))
+            option = self.resolver.number(employee_number)
+            if option and option.lastname == lastname:
+                continue
+            if option and self.resolver.alias(source, values[name]) == option:
+                continue
+            matches = matcher.match(lastname)
+            if matches and option:
+                if matches[0].employee == option and matcher.confident(matches):
+                    self.resolver.learn(source, values[name], option)
+                soft_match.update(
+                    {values[number]: [values[name]] + [
+                        '{} {} {} ({:.2f})'.format(
+                            match.employee.employee_number, match.employee.lastname,
+                            match.employee.firstname, match.score) for match in matches[:3]] + [
+                        '{} {} {}'.format(option.employee_number, option.lastname, option.firstname)]}
+                )
+                print('Soft match:{} {}'.format(values[number], soft_match.get(values[number])))
+            else:
+                missing.update({values[number]: values[name]})
+                print('Employee not found. Got {}: {}'.format(employee_number, lastname))
+        self.soft_match = soft_match
         return missing
 
     def add_missing_employee(self):
@@ -191,53 +589,247 @@ class EmployeeReader(BaseReader):
 
 
 class BaseMonthlyReader(BaseReader):
-    """Loads a VIP export file of number, name and balance as of YYYY-MM-DD."""
+    """Loads a VIP export file of number, name and balance as of YYYY-MM-DD.
+
+    If `aggregate` is True, balances are summed per employee and transaction date while
+    the file is read and written at the end with one bulk insert and one bulk update.
+    Otherwise each row is added to the model as it is read.
+
+    A load first deletes the rows the file replaces, see replaced_rows, so loading a file
+    again does not add its balances twice. Rows of the same employee and date within the
+    load are added up.
+
+    If `update_hrm` is True, Hrm.vip_balance of the employees loaded or deleted is set to
+    the sum of their balances with one set-based update, see balances.refresh_vip_balances.
+
+    If `use_staging_table` is True, aggregated balances are loaded into a TEMP table that replaces
+    the rows the file replaces, or is added to the model, in one short transaction at the
+    end, see publish_totals."""
 
     model = VipMonthly
+    source = 'vip'
+    dayfirst = True
+    aggregate = True
+    update_hrm = True
+    component_fields = []
+    update_fields = ['balance']
+    date_field = 'transaction_date'
     DATE = None
     EMPLOYEE_NUMBER = 0
     EMPLOYEE_NAME = 1
     BALANCE = 2
 
-    def __init__(self, filename, delimiter=None, file_object=None):
+    def __init__(self, filename, delimiter=None, file_object=None, resolver=None, aggregate=None):
         self.delimiter = ','
-        super().__init__(filename, delimiter, file_object)
+        if aggregate is not None:
+            self.aggregate = aggregate
+        super().__init__(filename, delimiter, file_object, resolver)
+
+    def replaced_rows(self):
+        """Override to return the existing rows a load of the file replaces, e.g. those of
+        its period. If None, the balances loaded are added to the existing rows."""
+        return None
 
     def pre_load(self):
-        pass
+        """Deletes the rows the file replaces, see replaced_rows. Staged loads delete them
+        when publishing instead."""
+        queryset = self.replaced_rows()
+        if queryset is None or self.use_staging_table:
+            return
+        employee_ids = self.delete_replaced(queryset)
+        if self.update_hrm:
+            self.update_hrm_balances(employee_ids)
+
+    def delete_replaced(self, queryset):
+        """Deletes the rows of `queryset`, marking their employees dirty from the earliest
+        date deleted, see mark_dirty, and returns the ids of the employees."""
+        employee_ids = []
+        earliest = queryset.order_by().values_list('employee_id').annotate(Min(self.date_field))
+        for employee_id, value in earliest:
+            self.mark_dirty(employee_id, value)
+            employee_ids.append(employee_id)
+        queryset.delete()
+        return employee_ids
 
     def load_process(self, f):
-        header = None
-        reader = csv.reader(f, delimiter=self.delimiter)
-        for values in reader:
-            # print(values)
-            if not header:
-                header = values
+        if self.checkpoint and not self.use_staging_table:
+            return self.load_checkpointed(f)
+        if self.aggregate:
+            return self.write_staged(self.stage_process(f))
+        employee_ids = OrderedDict()
+        for values in self.data_rows(f):
+            obj, employee = self.update_model(values)
+            if obj:
+                employee_ids[employee.pk] = None
+        if self.update_hrm:
+            self.update_hrm_balances(employee_ids)
+
+    def stage_process(self, f):
+        """Returns the balances of the file summed per employee and date, see accumulate."""
+        if not self.aggregate:
+            return super().stage_process(f)
+        totals = OrderedDict()
+        for values in self.data_rows(f):
+            self.accumulate(totals, values)
+        return totals
+
+    def write_staged(self, totals):
+        if self.use_staging_table:
+            return self.publish_totals(totals)
+        if totals:
+            self.write_totals(totals)
+        if self.update_hrm:
+            self.update_hrm_balances(self.employee_ids(totals))
+
+    def employee_ids(self, totals):
+        return list(OrderedDict((obj.employee_id, None) for obj in totals.values()))
+
+    def publish_totals(self, totals):
+        """Bulk loads the totals into a StagingTable, checks the rows and balance staged and
+        then, in one transaction, deletes the rows the file replaces, see replaced_rows, and
+        inserts the totals or, if there are none, adds them to existing rows and inserts the
+        others. If `update_hrm`, Hrm.vip_balance is updated in the same transaction."""
+        objs = list(totals.values())
+        replaced = self.replaced_rows()
+        with StagingTable(self.model) as staging:
+            with self.timed('staging_table'):
+                staging.insert(objs)
+                staging.validate(len(objs), {'balance': sum(obj.balance for obj in objs)})
+            with self.timed('write'), transaction.atomic():
+                employee_ids = self.employee_ids(totals)
+                if replaced is None:
+                    created, updated = staging.publish_added(
+                        ['employee', 'transaction_date', 'leave_period_start', 'leave_period_end'],
+                        ['balance'] + self.component_fields)
+                    self.published(totals, updated)
+                else:
+                    employee_ids = set(employee_ids).union(self.delete_replaced(replaced))
+                    created, updated = staging.publish(), 0
+                if self.update_hrm:
+                    self.update_hrm_balances(employee_ids)
+        self.rows_written += created + updated
+        return created, updated
+
+    def published(self, totals, updated):
+        """Override to finish, in the publish transaction, the `updated` rows that staged
+        totals were added to."""
+        pass
+
+    def load_checkpointed(self, f):
+        """Sums and writes the balances of each chunk of `checkpoint` rows in one transaction
+        with the LoadJournal, see BaseReader.open_journal."""
+        totals = OrderedDict()
+        committed = self.rows_read
+        for values in self.data_rows(f):
+            self.accumulate(totals, values)
+            if self.rows_read - committed >= self.checkpoint:
+                self.write_chunk(totals)
+                totals = OrderedDict()
+                committed = self.rows_read
+        self.write_chunk(totals)
+
+    def write_chunk(self, totals):
+        with transaction.atomic():
+            self.write_staged(totals)
+            self.save_journal()
+
+    def data_rows(self, f):
+        """Yields the rows after the header that should be loaded."""
+        for values in self.data_reader(f):
+            self.rows_read += 1
+            if self.include(values):
+                yield values
             else:
-                obj, employee = self.update_model(values)
-                if obj:
-                    self.update_hrm_balance(employee, obj)
+                self.rows_skipped += 1
+
+    def include(self, values):
+        """Returns True if the row should be loaded."""
+        return True
 
     def post_load(self):
         pass
 
     def employee(self, values):
-        try:
-            employee = Employee.objects.get(employee_number=int(values[self.EMPLOYEE_NUMBER]))
-        except Employee.DoesNotExist:
-            employee = None
+        employee = (self.resolver.number(values[self.EMPLOYEE_NUMBER]) or
+                    self.resolver.alias(self.source, values[self.EMPLOYEE_NAME]))
+        if not employee:
             print("Employee listed in {} not found. Got {} {}".format(
                 self.model._meta.verbose_name, int(values[self.EMPLOYEE_NUMBER]), values[self.EMPLOYEE_NAME]))
+            self.rows_unresolved += 1
         return employee
 
+    def transaction_date(self, values):
+        try:
+            transaction_date = self.dates.parse(values[self.DATE])
+        except (TypeError, IndexError):
+            transaction_date = self.period_end
+        if isinstance(transaction_date, datetime):
+            transaction_date = transaction_date.date()
+        return transaction_date
+
+    def components(self, values):
+        """Override to return a dictionary of {field: days} parsed from the row that are
+        added up like the balance."""
+        return {}
+
+    def add_components(self, obj, components):
+        for field, value in components.items():
+            setattr(obj, field, (getattr(obj, field) or 0) + value)
+
+    def components_of(self, obj):
+        return {field: getattr(obj, field) or 0 for field in self.component_fields}
+
+    def accumulate(self, totals, values):
+        """Adds the row's balance and components to an unsaved instance in `totals` keyed
+        by employee and date."""
+        employee = self.employee(values)
+        if employee:
+            transaction_date = self.transaction_date(values)
+            key = (employee.pk, transaction_date)
+            self.mark_dirty(employee.pk, transaction_date)
+            try:
+                totals[key].balance += Decimal(values[self.BALANCE])
+            except KeyError:
+                totals[key] = self.model(
+                    employee=employee,
+                    employee_number=employee.employee_number,
+                    transaction_date=transaction_date,
+                    fullname=values[self.EMPLOYEE_NAME],
+                    leave_period_start=transaction_date + relativedelta(day=1),
+                    leave_period_end=transaction_date + relativedelta(day=31),
+                    balance=Decimal(values[self.BALANCE]),
+                )
+            self.add_components(totals[key], self.components(values))
+
+    def write_totals(self, totals):
+        """Adds the accumulated balances to existing rows, read in one query, and inserts the rest."""
+        key = lambda obj: (obj.employee_id, obj.transaction_date, obj.leave_period_start, obj.leave_period_end)
+        existing = {}
+        transaction_dates = sorted(set(obj.transaction_date for obj in totals.values()))
+        for obj in self.model.objects.filter(transaction_date__in=transaction_dates):
+            existing.setdefault(key(obj), obj)
+        created, updated = [], []
+        for obj in totals.values():
+            try:
+                existing_obj = existing[key(obj)]
+            except KeyError:
+                created.append(obj)
+            else:
+                existing_obj.balance += obj.balance
+                self.add_components(existing_obj, self.components_of(obj))
+                updated.append(existing_obj)
+        with self.timed('write'), transaction.atomic():
+            self.model.objects.bulk_create(created)
+            bulk_update(updated, self.update_fields)
+        self.rows_written += len(created) + len(updated)
+        return created, updated
+
     def update_model(self, values):
         obj = None
         employee = self.employee(values)
         if employee:
-            try:
-                transaction_date = parse(values[self.DATE], dayfirst=True)
-            except (TypeError, IndexError):
-                transaction_date = self.period_end
+            transaction_date = self.transaction_date(values)
+            self.mark_dirty(employee.pk, transaction_date)
             try:
                 obj = self.model.objects.get(
                     employee=employee,
@@ -246,9 +838,8 @@ class BaseMonthlyReader(BaseReader):
                     transaction_date=transaction_date,
                 )
                 obj.balance += Decimal(values[self.BALANCE])
-                obj.save()
             except self.model.DoesNotExist:
-                obj = self.model.objects.create(
+                obj = self.model(
                     employee=employee,
                     employee_number=employee.employee_number,
                     transaction_date=transaction_date,
@@ -257,30 +848,50 @@ class BaseMonthlyReader(BaseReader):
                     leave_period_end=transaction_date + relativedelta(day=31),
                     balance=Decimal(values[self.BALANCE]),
                 )
+            self.add_components(obj, self.components(values))
+            obj.save()
+            self.rows_written += 1
         return obj, employee
 
-    def update_hrm_balance(self, employee, obj):
-        try:
-            hrm = Hrm.objects.get(employee=employee)
-            hrm.vip_balance += obj.balance
-            hrm.save()
-        except Hrm.DoesNotExist:
-            if not employee.termination_date:
-                pass
+    def update_hrm_balances(self, employee_ids):
+        """Sets Hrm.vip_balance of the employees to the sum of their VIP and opening balances
+        with one update statement per MAX_PARAMS employees."""
+        employee_ids = list(employee_ids)
+        with self.timed('update_hrm'):
+            for i in range(0, len(employee_ids), MAX_PARAMS):
+                refresh_vip_balances(Hrm.objects.filter(employee_id__in=employee_ids[i:i + MAX_PARAMS]))
 
 
 class VipMonthlyReader(BaseMonthlyReader):
 
-    def __init__(self, filename, month, year, delimiter=None, file_object=None):
+    def __init__(self, filename, month, year, delimiter=None, file_object=None, resolver=None, aggregate=None):
         self.period_start = date(year, month, 1)
         self.period_end = (self.period_start + relativedelta(months=+1)) - timedelta(days=1)
-        super().__init__(filename, delimiter, file_object)
+        super().__init__(filename, delimiter, file_object, resolver, aggregate)
+
+    def journal_key(self):
+        return self.period_start.isoformat()
+
+    def replaced_rows(self):
+        return self.model.objects.filter(transaction_date__range=(self.period_start, self.period_end))
 
 
 class HrmMonthlyReader(BaseMonthlyReader):
-    """Loads a HRM 'Leave List' export file of number, name and balance as of YYYY-MM-DD."""
+    """Loads a HRM 'Leave List' export file of number, name and balance as of YYYY-MM-DD.
+
+    The pending approval, scheduled and taken days in each row's status are added up in
+    their own fields. The statuses of rows added together are added up too, keeping
+    labels that are not components, e.g. 'Cancelled', see status.add_status.
+
+    If `month` and `year` are given the file is the leave list of that month: a load
+    replaces the rows of the month and skips rows dated outside it. Otherwise the file's
+    balances are added to the rows loaded before."""
 
     model = HrmMonthly
+    source = 'leave_list'
+    update_hrm = False
+    component_fields = STATUS_FIELDS
+    update_fields = ['balance', 'status'] + STATUS_FIELDS
     DATE = 0
     EMPLOYEE_NAME = 1
     LEAVETYPE = 2
@@ -288,28 +899,65 @@ class HrmMonthlyReader(BaseMonthlyReader):
     Status = 4
     Comments = 5
 
-    def load_process(self, f):
-        header = None
-        reader = csv.reader(f, delimiter=self.delimiter)
-        for values in reader:
-            if not header:
-                header = values
-            else:
-                if values[self.LEAVETYPE] == 'Annual Leave':
-                    self.update_model(values)
+    def __init__(self, filename, delimiter=None, file_object=None, resolver=None, aggregate=None,
+                 month=None, year=None):
+        self.period_start = date(year, month, 1) if month and year else None
+        self.period_end = self.period_start + relativedelta(day=31) if self.period_start else None
+        super().__init__(filename, delimiter, file_object, resolver, aggregate)
+
+    def journal_key(self):
+        return self.period_start.isoformat() if self.period_start else ''
+
+    def replaced_rows(self):
+        if self.period_start:
+            return self.model.objects.filter(transaction_date__range=(self.period_start, self.period_end))
+        return None
+
+    def include(self, values):
+        if values[self.LEAVETYPE] != 'Annual Leave':
+            return False
+        if self.period_start and not self.period_start <= self.transaction_date(values) <= self.period_end:
+            print('Leave list row dated outside {:%Y-%m}. Got {} {}.'.format(
+                self.period_start, values[self.DATE], values[self.EMPLOYEE_NAME]))
+            return False
+        return True
+
+    def components(self, values):
+        """Returns the days per component field of the row's status and, as 'status', the status."""
+        status = values[self.Status] if len(values) > self.Status else ''
+        components = parse_status(status)
+        components['status'] = status
+        return components
+
+    def components_of(self, obj):
+        components = super().components_of(obj)
+        components['status'] = obj.status
+        return components
+
+    def add_components(self, obj, components):
+        components = dict(components)
+        obj.status = add_status(obj.status, components.pop('status', ''))
+        super().add_components(obj, components)
+
+    def published(self, totals, updated):
+        """Adds the statuses of the staged totals to those of the rows they were added to."""
+        if not updated:
+            return
+        key = lambda obj: (obj.employee_id, obj.transaction_date, obj.leave_period_start, obj.leave_period_end)
+        staged = {key(obj): obj for obj in totals.values()}
+        transaction_dates = sorted(set(obj.transaction_date for obj in totals.values()))
+        objs = [obj for obj in self.model.objects.filter(transaction_date__in=transaction_dates) if key(obj) in staged]
+        for obj in objs:
+            obj.status = add_status(obj.status, staged[key(obj)].status)
+        bulk_update(objs, ['status'])
 
     def employee(self, values):
         firstname, middlename, lastname, strippedname = self.names(values[self.EMPLOYEE_NAME].split(' '))
-        try:
-            employee = Employee.objects.get(
-                lastname=lastname, firstname=firstname)
-        except Employee.DoesNotExist:
-            try:
-                employee = Employee.objects.get(
-                    strippedname=strippedname)
-            except Employee.DoesNotExist:
-                employee = None
-                print("Employee in {} not found. Got {} {} {}".format(
+        employee = (self.resolver.alias(self.source, values[self.EMPLOYEE_NAME]) or
+                    self.resolver.name(lastname, firstname, strippedname=strippedname, match_middlename=False))
+        if not employee:
+            self.rows_unresolved += 1
+            print("Employee in {} not found. Got {} {} {}".format(
                     self.model._meta.verbose_name, firstname, middlename, lastname))
         return employee
 
@@ -317,48 +965,108 @@ class HrmMonthlyReader(BaseMonthlyReader):
 class OpeningBalancesReader(BaseMonthlyReader):
 
     model = OpeningBalances
+    source = None
+    date_field = 'balance_date'
+    aggregate = False
     EMPLOYEE_NUMBER = 0
     LASTNAME = 1
     FIRSTNAME = 2
     JOINED = 3
     BALANCE = 4
 
-    def __init__(self, filename, balance_date, delimiter=None, file_object=None):
+    def __init__(self, filename, balance_date, delimiter=None, file_object=None, resolver=None):
         self.balance_date = balance_date
-        super(BaseMonthlyReader, self).__init__(filename, delimiter, file_object=file_object)
+        super(BaseMonthlyReader, self).__init__(filename, delimiter, file_object=file_object, resolver=resolver)
+
+    def replaced_rows(self):
+        """The file lists the opening balance of every employee, so replaces them all."""
+        return self.model.objects.all()
+
+    def mark_dirty(self, employee_id, value):
+        """An opening balance is carried into every month's balance, so the employee is
+        marked from the first month of the cube whatever the balance date."""
+        super().mark_dirty(employee_id, date.min)
+
+    def load_process(self, f):
+        """Adds the opening balances with one bulk insert after creating, also in bulk,
+        the employees listed that are not loaded yet.
+
+        If `checkpoint` is set this is done for each chunk of rows in one transaction with
+        the LoadJournal."""
+        rows = self.data_rows(f)
+        if not self.checkpoint:
+            return self.write_rows(list(rows))
+        chunk = list(islice(rows, self.checkpoint))
+        while chunk:
+            with transaction.atomic():
+                self.write_rows(chunk)
+                self.save_journal()
+            chunk = list(islice(rows, self.checkpoint))
+
+    def write_rows(self, rows):
+        self.add_employees(rows)
+        objs = [obj for obj, employee in map(self.update_model, rows) if obj]
+        with self.timed('write'), transaction.atomic():
+            self.model.objects.bulk_create(objs)
+        self.rows_written += len(objs)
+        if self.update_hrm:
+            self.update_hrm_balances(OrderedDict((obj.employee_id, None) for obj in objs))
+
+    def add_employees(self, rows):
+        """Creates the employees not found by number with one bulk insert and adds them to the resolver."""
+        missing = OrderedDict()
+        for values in rows:
+            employee_number = int(values[self.EMPLOYEE_NUMBER])
+            if not self.resolver.number(employee_number) and employee_number not in missing:
+                missing[employee_number] = Employee(
+                    employee_number=employee_number,
+                    lastname=values[self.LASTNAME],
+                    firstname=values[self.FIRSTNAME],
+                    joined=self.dates.parse(values[self.JOINED]).date(),
+                    manually_added=True,
+                )
+        if missing:
+            with self.timed('write'), transaction.atomic():
+                Employee.objects.bulk_create(missing.values())
+            employee_numbers = list(missing)
+            for i in range(0, len(employee_numbers), MAX_PARAMS):
+                for employee in Employee.objects.filter(employee_number__in=employee_numbers[i:i + MAX_PARAMS]):
+                    self.resolver.add(employee)
+        return list(missing.values())
 
     def update_model(self, values):
-        """Confirms join date with employee"""
+        """Returns an unsaved opening balance and the employee, confirming the join date."""
         obj = None
         employee = self.employee(values)
         if employee:
-            obj = self.model.objects.create(
+            obj = self.model(
                 employee=employee,
                 balance=Decimal(values[self.BALANCE]),
                 balance_date=self.balance_date
             )
-        if parse(values[self.JOINED], dayfirst=True).date() != employee.joined:
-            print(
-                'Non-matched joined date from open balance. Expected {}. Got {}.'.format(
-                    parse(values[self.JOINED], dayfirst=True).date(),
-                    employee.joined)
-            )
+            self.mark_dirty(employee.pk, self.balance_date)
+            joined = self.dates.parse(values[self.JOINED]).date()
+            if joined != employee.joined:
+                print(
+                    'Non-matched joined date from open balance. Expected {}. Got {}.'.format(
+                        joined, employee.joined)
+                )
         return obj, employee
 
     def post_load(self):
         pass
 
     def employee(self, values):
-        try:
-            employee = Employee.objects.get(employee_number=int(values[self.EMPLOYEE_NUMBER]))
-        except Employee.DoesNotExist:
+        employee = self.resolver.number(values[self.EMPLOYEE_NUMBER])
+        if not employee:
             employee = Employee.objects.create(
                 employee_number=int(values[self.EMPLOYEE_NUMBER]),
                 lastname=values[self.LASTNAME],
                 firstname=values[self.FIRSTNAME],
-                joined=parse(values[self.JOINED], dayfirst=True).date(),
+                joined=self.dates.parse(values[self.JOINED]).date(),
                 manually_added=True,
             )
+            self.resolver.add(employee)
         return employee
 
 
@@ -366,41 +1074,50 @@ class EmployeesFinanceReader:
     """Loads names and checks them against HRM from a raw file used to
     transfer data from payroll to accounts.
 
-    Ideally all names should point to an Employee in HRM."""
+    Names are "LASTNAME F." and are looked up in the payroll aliases and then matched
+    with a NameMatcher on the surname and first initial. Ideally all names should point to an Employee in HRM."""
 
     encoding = 'latin-1'
+    source = 'payroll'
+    NAME = 0
 
-    def __init__(self, filename):
-        filename = os.path.expanduser(filename)
+    def __init__(self, filename, file_object=None, resolver=None, matcher=None):
+        self.employees = {}
+        self.ambiguous = {}
+        self.missing = []
+        self.resolver = resolver or EmployeeResolver()
+        self.matcher = matcher or NameMatcher(self.resolver.by_number.values())
+        if file_object:
+            self.load_names(file_object)
+        else:
+            with open(os.path.expanduser(filename), encoding=self.encoding, newline='') as f:
+                self.load_names(f)
+
+    def load_names(self, f):
         header = None
-        with open(filename, encoding=self.encoding, newline='') as f:
-            all_values = []
-            reader = csv.reader(f, delimiter=',')
-            for values in reader:
-                if not header:
-                    header = values
-                else:
-                    all_values.append(values[self.NAME])
-        values = list(set(all_values))
-        for value in values:
-            self.employee([value])
+        all_values = []
+        reader = csv.reader(f, delimiter=',')
+        for values in reader:
+            if not header:
+                header = values
+            else:
+                all_values.append(values[self.NAME])
+        for value in sorted(set(all_values)):
+            self.employees[value] = self.employee(value)
 
     def employee(self, name):
-        employee = None
+        employee = self.resolver.alias(self.source, name)
+        if employee:
+            return employee
         name_as_list = name.replace('.', ' ').split(' ')
         name_as_list = [v for v in name_as_list if v]
         lastname = name_as_list[0]
-        try:
-            first_initial = name_as_list[1]
-            options = {'lastname': lastname, 'firstname__startswith': first_initial[0]}
-        except IndexError:
-            options = {'lastname': lastname}
-            first_initial = [' ']
-        try:
-            employee = Employee.objects.get(**options)
-        except MultipleObjectsReturned:
-            employees = Employee.objects.filter(**options)
-            print('Employee name {} is ambiguous. Got {}'.format(name, [employee for employee in employees]))
-        except Employee.DoesNotExist:
-            print("Employee not found in HRM. Got {} {} {}".format(lastname, first_initial[0], name_as_list))
+        first_initial = name_as_list[1][0] if len(name_as_list) > 1 else None
+        employee, matches = self.matcher.best(lastname, first_initial)
+        if not matches:
+            self.missing.append(name)
+            print("Employee not found in HRM. Got {} {} {}".format(lastname, first_initial or ' ', name_as_list))
+        elif not employee:
+            self.ambiguous[name] = matches
+            print('Employee name {} is ambiguous. Got {}'.format(name, matches))
         return employee
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import mmap
+import os
+
+from collections import namedtuple
+
+from .models import FileRegistry
+
+CHUNK_SIZE = 1 << 20
+
+Fingerprint = namedtuple('Fingerprint', ['size', 'mtime', 'sha256'])
+
+
+def content_hash(filename, chunk_size=CHUNK_SIZE):
+    """Returns the SHA-256 hex digest of the file, hashed in chunks of a memory map
+    so the file is never read into memory as a whole."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for offset in range(0, len(m), chunk_size):
+                    digest.update(m[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+
+def fingerprint(filename):
+    stat = os.stat(filename)
+    return Fingerprint(stat.st_size, stat.st_mtime, content_hash(filename))
+
+
+def registry_key(reader):
+    return (reader.__class__.__name__, reader.filename, reader.journal_key())
+
+
+def changed(readers, force=False):
+    """Returns a list of (reader, fingerprint) of the readers whose file is not in the
+    FileRegistry or has changed since it was last loaded, or of all readers if `force`.
+
+    A file with the size and mtime registered is taken as unchanged without hashing it.
+    Otherwise it is unchanged if its size and content hash are, e.g. after being copied
+    again. Readers of a file object are never skipped and get no fingerprint."""
+    filenames = [reader.filename for reader in readers if reader.filename and not reader.file_object]
+    entries = {} if force else {
+        (entry.reader, entry.filename, entry.key): entry
+        for entry in FileRegistry.objects.filter(filename__in=filenames)}
+    pending = []
+    for reader in readers:
+        if not reader.filename or reader.file_object:
+            pending.append((reader, None))
+            continue
+        entry = entries.get(registry_key(reader))
+        stat = os.stat(reader.filename)
+        if entry and (entry.size, entry.mtime) == (stat.st_size, stat.st_mtime):
+            print('Unchanged, skipped {}'.format(reader.filename))
+            continue
+        sha256 = content_hash(reader.filename)
+        if entry and (entry.size, entry.sha256) == (stat.st_size, sha256):
+            entry.mtime = stat.st_mtime
+            entry.save(update_fields=['mtime'])
+            print('Unchanged, skipped {}'.format(reader.filename))
+            continue
+        pending.append((reader, Fingerprint(stat.st_size, stat.st_mtime, sha256)))
+    return pending
+
+
+def register(pending):
+    """Saves the fingerprint and LoadReport of each loaded (reader, fingerprint) from changed."""
+    for reader, fingerprint in pending:
+        if not fingerprint:
+            continue
+        name, filename, key = registry_key(reader)
+        FileRegistry.objects.update_or_create(
+            reader=name, filename=filename, key=key,
+            defaults={'size': fingerprint.size, 'mtime': fingerprint.mtime, 'sha256': fingerprint.sha256,
+                      'rows_read': reader.report.rows_read, 'rows_written': reader.report.rows_written,
+                      'result': json.dumps(reader.report.as_dict())})
@@ -1,11 +1,96 @@
-from datetime import date
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from django.db.models import Q
+from django.db.models import Count, Q, Sum
 
 from .models import Employee
 from .load import load_employee
 from hrm.load import load_vip_monthly
-from hrm.models import VipMonthly
+from hrm.models import HrmMonthly, VipMonthly
+from hrm.status import FIELDS as STATUS_FIELDS
+
+
+GRANULARITY = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+class Headcount(object):
+    """Joined, terminated and active employee counts per period computed from one
+    grouped query on (joined, termination_date).
+
+    Active is the headcount at the end of each period, as Employees.active_employees.
+
+        headcount = Headcount.for_range(date(2013, 1, 1), date(2015, 12, 31), 'quarter', by=['location'])
+        for row in headcount.rows(): ...
+    """
+
+    def __init__(self, periods, by=None):
+        self.periods = [(as_date(start), as_date(end)) for start, end in periods]
+        self.by = list(by or [])
+        self.starts = [start for start, _ in self.periods]
+        self.ends = [end for _, end in self.periods]
+        self.joined = OrderedDict()
+        self.terminated = OrderedDict()
+        self.active = OrderedDict()
+        self.total = 0
+        queryset = Employee.objects.values('joined', 'termination_date', *self.by).annotate(
+            count=Count('id')).order_by(*self.by)
+        events = OrderedDict()
+        for row in queryset:
+            group = tuple(row[field] for field in self.by)
+            self.total += row['count']
+            if group not in self.joined:
+                self.joined[group] = [0] * len(self.periods)
+                self.terminated[group] = [0] * len(self.periods)
+                events[group] = [0] * (len(self.periods) + 1)
+            self.add(self.joined[group], row['joined'], row['count'])
+            if row['termination_date']:
+                self.add(self.terminated[group], row['termination_date'], row['count'])
+            if not row['termination_date'] or row['termination_date'] >= row['joined']:
+                events[group][bisect_left(self.ends, row['joined'])] += row['count']
+            if row['termination_date'] and row['termination_date'] >= row['joined']:
+                events[group][bisect_left(self.ends, row['termination_date'] + timedelta(days=1))] -= row['count']
+        for group, deltas in events.items():
+            active, count = [], 0
+            for delta in deltas[:-1]:
+                count += delta
+                active.append(count)
+            self.active[group] = active
+
+    @classmethod
+    def for_range(cls, start_date, end_date, granularity='month', by=None):
+        """Returns a Headcount for the months, quarters or years covering start_date to end_date."""
+        months = GRANULARITY[granularity]
+        start_date = as_date(start_date)
+        period_start = date(start_date.year, (start_date.month - 1) // months * months + 1, 1)
+        periods = []
+        while period_start <= as_date(end_date):
+            next_start = period_start + relativedelta(months=months)
+            periods.append((period_start, next_start - timedelta(days=1)))
+            period_start = next_start
+        return cls(periods, by)
+
+    def add(self, counts, value, count):
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            counts[i] += count
+
+    def rows(self):
+        """Yields a dictionary per group and period."""
+        for group in self.joined:
+            for i, (start, end) in enumerate(self.periods):
+                row = OrderedDict(zip(self.by, group))
+                row.update(start=start, end=end, joined=self.joined[group][i],
+                           terminated=self.terminated[group][i], active=self.active[group][i])
+                yield row
+
+    def totals(self, counts):
+        """Returns the counts summed over all groups per period."""
+        return [sum(values) for values in zip(*counts.values())] if counts else [0] * len(self.periods)
 
 
 class Employees(object):
@@ -15,21 +100,16 @@ class Employees(object):
             Employee.objects.all().delete()
             load_employee()
             load_vip_monthly()
-        self.total = Employee.objects.all().count()
-        self.joined = []
-        self.terminated = []
         start_date = start_date or date(1900, 1, 1)
-        count = self.joined_in_period(start_date, end_date).count()
-        self.joined.append((end_date + relativedelta(day=1), count))
-        count = self.terminated_in_period(start_date, end_date).count()
-        self.terminated.append((end_date + relativedelta(day=1), count))
+        periods = [(start_date, end_date)]
         for _ in range(0, 9):
             end_date = (end_date + relativedelta(months=1)) + relativedelta(day=31)
-            start_date = end_date + relativedelta(day=1)
-            count = self.joined_in_period(start_date, end_date).count()
-            self.joined.append((start_date, count))
-            count = self.terminated_in_period(start_date, end_date).count()
-            self.terminated.append((start_date, count))
+            periods.append((end_date + relativedelta(day=1), end_date))
+        headcount = Headcount(periods)
+        labels = [periods[0][1] + relativedelta(day=1)] + [start for start, _ in periods[1:]]
+        self.total = headcount.total
+        self.joined = list(zip(labels, headcount.totals(headcount.joined)))
+        self.terminated = list(zip(labels, headcount.totals(headcount.terminated)))
 
     def joined_in_period(self, start_date, end_date):
         return Employee.objects.filter(
@@ -52,3 +132,13 @@ class Employees(object):
         return VipMonthly.objects.filter(
             transaction_date__gte=end_date + relativedelta(day=1),
             transaction_date__lte=end_date)
+
+    def leave_days(self, start_date, end_date, by=None):
+        """Returns a list of dictionaries of the pending approval, scheduled and taken days in
+        HrmMonthly with transaction dates from start_date to end_date, summed in one grouped
+        query per `by`, a list of fields such as ['employee__location'], or in total."""
+        queryset = HrmMonthly.objects.filter(transaction_date__range=(start_date, end_date))
+        sums = {field: Sum(field) for field in STATUS_FIELDS}
+        if not by:
+            return [queryset.aggregate(**sums)]
+        return list(queryset.values(*by).annotate(**sums).order_by(*by))
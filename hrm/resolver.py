@@ -0,0 +1,102 @@
+import re
+
+from .models import Employee, EmployeeAlias
+
+
+def alias_key(name):
+    """Returns a source name normalized for EmployeeAlias.key.
+
+    Case, punctuation, repeated spaces, the '(Past Employee)' suffix and the order
+    of the names are ignored, e.g. 'Jon  Anderson (Past Employee)' -> 'anderson jon'."""
+    name = re.sub(r'\(\s*past\s+employee\s*\)', ' ', (name or '').lower())
+    return ' '.join(sorted(re.sub('[^a-z ]', ' ', name).split()))
+
+
+class EmployeeResolver(object):
+    """Resolves employees from in-memory dictionaries built with a single query.
+
+    Build one per load and share it between readers instead of querying
+    Employee for every data row.
+
+    Learned aliases are loaded with one more query the first time one is looked up."""
+
+    def __init__(self, queryset=None):
+        self.by_number = {}
+        self.by_name = {}
+        self.by_fullname = {}
+        self.by_strippedname = {}
+        self.by_key = {}
+        self._aliases = None
+        queryset = Employee.objects.all() if queryset is None else queryset
+        for employee in queryset:
+            self.add(employee)
+
+    def __len__(self):
+        return len(self.by_number)
+
+    @property
+    def aliases(self):
+        """A dictionary of employees by (source, key), see load_aliases."""
+        if self._aliases is None:
+            self.load_aliases()
+        return self._aliases
+
+    def load_aliases(self):
+        """Reads the learned aliases with one query, e.g. before the resolver is copied to
+        worker processes that must not query."""
+        self._aliases = {}
+        for source, key, employee_number in EmployeeAlias.objects.values_list(
+                'source', 'key', 'employee__employee_number'):
+            employee = self.by_number.get(employee_number)
+            if employee:
+                self._aliases[(source, key)] = employee
+
+    def add(self, employee):
+        """Adds or refreshes an employee in every index."""
+        self.by_number[int(employee.employee_number)] = employee
+        self.by_name[(employee.lastname, employee.firstname)] = employee
+        self.by_fullname[(employee.lastname, employee.firstname, employee.middlename)] = employee
+        if employee.strippedname:
+            self.by_strippedname[employee.strippedname] = employee
+        for names in [(employee.firstname, employee.lastname),
+                      (employee.firstname, employee.middlename, employee.lastname)]:
+            key = alias_key(' '.join(name for name in names if name))
+            self.by_key.setdefault(key, set()).add(int(employee.employee_number))
+
+    def number(self, employee_number):
+        return self.by_number.get(int(employee_number))
+
+    def name(self, lastname, firstname, middlename=None, strippedname=None, match_middlename=True):
+        """Returns the employee by name, falling back to the stripped name, or None.
+
+        Mirrors the lookups previously done with Employee.objects.get."""
+        if match_middlename:
+            employee = self.by_fullname.get((lastname, firstname, middlename))
+        else:
+            employee = self.by_name.get((lastname, firstname))
+        if not employee and strippedname:
+            employee = self.by_strippedname.get(strippedname)
+        return employee
+
+    def alias(self, source, name):
+        """Returns the employee learned for the name as spelled in source, or None."""
+        if not source or not name:
+            return None
+        return self.aliases.get((source, alias_key(name)))
+
+    def learn(self, source, name, employee):
+        """Saves the name as spelled in source as an alias of the employee.
+
+        Not saved if the key is also the name of another employee, e.g. 'Kgosi Tebogo' for
+        Tebogo Kgosi while there is a Kgosi Tebogo, as the alias would resolve the other
+        employee's rows to this one. Returns True if the alias is new or now points to
+        another employee."""
+        key = alias_key(name)
+        if not source or not key or self.aliases.get((source, key)) == employee:
+            return False
+        if self.by_key.get(key, set()) - {int(employee.employee_number)}:
+            print('Alias not learned. {} is also the name of another employee. Got {}.'.format(name, employee))
+            return False
+        EmployeeAlias.objects.update_or_create(source=source, key=key, defaults={'employee': employee})
+        self.aliases[(source, key)] = employee
+        return True
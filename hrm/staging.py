@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class StagingError(Exception):
+    pass
+
+
+class StagingTable(object):
+    """A TEMP table with the columns of a model's table that rows are bulk loaded into and
+    validated before being published to the model's table in one short transaction.
+
+        with StagingTable(Hrm) as staging:
+            staging.insert(rows)
+            staging.validate(len(rows), {'hrm_balance': sum(hrm.hrm_balance for hrm in rows)})
+            with transaction.atomic():
+                Hrm.objects.filter(leave_period_start=start).delete()
+                staging.publish()
+
+    Only this connection sees the TEMP table, so the model's table stays readable, and
+    writable by others, until publish. Rows are inserted without a primary key, which
+    the model's table assigns on publish."""
+
+    def __init__(self, model, using=None):
+        self.model = model
+        self.connection = connections[using or DEFAULT_DB_ALIAS]
+        self.fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        self.columns = [field.column for field in self.fields]
+        self.name = '{}_staging'.format(model._meta.db_table)
+        self.rows = 0
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.drop()
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def column_list(self, alias=None):
+        prefix = '{}.'.format(alias) if alias else ''
+        return ', '.join(prefix + self.quote(column) for column in self.columns)
+
+    def execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def fetchone(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    def create(self):
+        self.drop()
+        self.execute('CREATE TEMP TABLE {} AS SELECT {} FROM {} WHERE 1 = 0'.format(
+            self.quote(self.name), self.column_list(), self.quote(self.model._meta.db_table)))
+        self.rows = 0
+
+    def drop(self):
+        self.execute('DROP TABLE IF EXISTS {}'.format(self.quote(self.name)))
+
+    def insert(self, objs):
+        """Inserts unsaved model instances with one executemany."""
+        params = [[field.get_db_prep_save(getattr(obj, field.attname), self.connection) for field in self.fields]
+                  for obj in objs]
+        if params:
+            with self.connection.cursor() as cursor:
+                cursor.executemany('INSERT INTO {} ({}) VALUES ({})'.format(
+                    self.quote(self.name), self.column_list(), ', '.join(['%s'] * len(self.columns))), params)
+        self.rows += len(params)
+
+    def validate(self, rows, totals=None):
+        """Raises StagingError unless the table has `rows` rows and, for each field in
+        `totals`, a dictionary of {field name: expected sum}, the sum expected."""
+        totals = totals or {}
+        names = list(totals)
+        values = self.fetchone('SELECT COUNT(*){} FROM {}'.format(
+            ''.join(', SUM({})'.format(self.quote(self.model._meta.get_field(name).column)) for name in names),
+            self.quote(self.name)))
+        if values[0] != rows:
+            raise StagingError('{} staged {} rows. Expected {}.'.format(
+                self.model._meta.verbose_name, values[0], rows))
+        for name, value in zip(names, values[1:]):
+            value = Decimal(str(value or 0))
+            if abs(value - totals[name]) >= Decimal('0.01'):
+                raise StagingError('{} staged a total {} of {}. Expected {}.'.format(
+                    self.model._meta.verbose_name, name, value, totals[name]))
+
+    def publish(self):
+        """Inserts the staged rows into the model's table and returns the rows inserted.
+        Call in the transaction that deletes the rows they replace."""
+        return self.execute('INSERT INTO {0} ({1}) SELECT {1} FROM {2}'.format(
+            self.quote(self.model._meta.db_table), self.column_list(), self.quote(self.name)))
+
+    def publish_added(self, keys, fields):
+        """Adds `fields` of the staged rows to those of the rows of the model's table that
+        match on `keys`, lists of field names, and inserts the others. Returns (inserted, updated)."""
+        table = self.quote(self.model._meta.db_table)
+        column = lambda name: self.quote(self.model._meta.get_field(name).column)
+        match = ' AND '.join('s.{0} = {1}.{0}'.format(column(key), table) for key in keys)
+        updated = self.execute('UPDATE {0} SET {1} WHERE EXISTS (SELECT 1 FROM {2} s WHERE {3})'.format(
+            table,
+            ', '.join('{0} = COALESCE({0}, 0) + (SELECT COALESCE(SUM(s.{0}), 0) FROM {1} s WHERE {2})'.format(
+                column(field), self.quote(self.name), match) for field in fields),
+            self.quote(self.name), match))
+        inserted = self.execute(
+            'INSERT INTO {0} ({1}) SELECT {2} FROM {3} s WHERE NOT EXISTS (SELECT 1 FROM {0} WHERE {4})'.format(
+                table, self.column_list(), self.column_list('s'), self.quote(self.name), match))
+        return inserted, updated
@@ -0,0 +1,55 @@
+import re
+
+from collections import OrderedDict
+from decimal import Decimal
+
+# leave list status labels and the HrmMonthly fields their days are kept in
+COMPONENTS = OrderedDict([
+    ('Pending Approval', 'pending_approval'),
+    ('Scheduled', 'scheduled'),
+    ('Taken', 'taken'),
+])
+FIELDS = list(COMPONENTS.values())
+LABEL = re.compile(r'([A-Za-z][\w -]*?)\s*\(\s*(-?\d+(?:\.\d+)?)\s*\)')
+
+
+def parse_labels(status):
+    """Returns a dictionary of the days per label in a leave list status, in the order
+    the labels first appear and added up if a label appears more than once, e.g.
+    'Taken(1.0000) Cancelled(2.0000)' -> {'Taken': 1, 'Cancelled': 2}."""
+    days = OrderedDict()
+    for label, value in LABEL.findall(status or ''):
+        label = ' '.join(label.split())
+        days[label] = days.get(label, Decimal('0')) + Decimal(value)
+    return days
+
+
+def parse_status(status):
+    """Returns a dictionary of the days per component field in a leave list status, e.g.
+    'Scheduled(8.0000) Taken(10.0000)' -> {'pending_approval': 0, 'scheduled': 8, 'taken': 10}.
+
+    Components not in the status are zero and other labels, e.g. 'Cancelled', are ignored."""
+    days = OrderedDict((field, Decimal('0')) for field in FIELDS)
+    for label, value in parse_labels(status).items():
+        if label in COMPONENTS:
+            days[COMPONENTS[label]] += value
+    return days
+
+
+def format_status(days):
+    """Returns the status for a dictionary of days per label, the reverse of parse_labels.
+
+    Components come first, leaving out those with no days, followed by the other labels,
+    e.g. 'Cancelled', which are kept as given."""
+    labels = [(label, days[label]) for label in COMPONENTS if days.get(label)]
+    labels += [(label, value) for label, value in days.items() if label not in COMPONENTS]
+    return ' '.join('{}({:.4f})'.format(label, value) for label, value in labels)
+
+
+def add_status(*statuses):
+    """Returns the status of rows added up, with the days of each label summed, see format_status."""
+    days = OrderedDict()
+    for status in statuses:
+        for label, value in parse_labels(status).items():
+            days[label] = days.get(label, Decimal('0')) + value
+    return format_status(days)
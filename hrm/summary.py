@@ -8,18 +8,26 @@ from collections import OrderedDict
 from copy import copy
 from datetime import date
 from dateutil.relativedelta import relativedelta
+from django.db.models import Sum
 
 from .models import Employee, VipMonthly, HrmMonthly, OpeningBalances
+from .status import FIELDS as STATUS_FIELDS
 
 
 class Summarize:
+    """Summarizes leave balances for an employee.
 
-    def __init__(self, employee, reference_date, carry_forward=None, write_path=None):
+    `opening_balance` and `taken`, a list of (leave_period_start, leave_period_end, balance)
+    from HrmMonthly, may be passed in if already loaded, see `summarize_all`."""
+
+    def __init__(self, employee, reference_date, carry_forward=None, write_path=None,
+                 opening_balance=None, taken=None):
         self.employee = employee
         self.write_path = write_path
         self.reference_date = reference_date + relativedelta(day=31)
-        self.opening_balance = OpeningBalances.objects.get(employee=self.employee)
+        self.opening_balance = opening_balance or OpeningBalances.objects.get(employee=self.employee)
         self.carry_forward = carry_forward or 0
+        self.taken = taken
 
     def __repr__(self):
         return '{}({!r}, {!r})'.format(self.__class__.__name__, self.employee, self.reference_date)
@@ -48,26 +56,78 @@ class Summarize:
         return self.carry_forward + accrued - self.monthly_taken(leave_period_start, self.reference_date)
 
     def monthly_taken(self, start_date, end_date):
+        """Returns the days of the employee's HrmMonthly rows from start_date to end_date,
+        summed in one query unless `taken` was passed in.
+
+        The days are the row's balance, all days booked whether pending approval, scheduled
+        or taken, see leave_days for each. Rows loaded before the status components were
+        stored have a balance but no components until their leave list is loaded again."""
         taken = Decimal('0.00')
-        for hrm_monthly in HrmMonthly.objects.filter(
-                employee=self.employee,
+        if self.taken is not None:
+            start_date, end_date = [d.date() if isinstance(d, datetime) else d for d in (start_date, end_date)]
+            for leave_period_start, leave_period_end, balance in self.taken:
+                if leave_period_start >= start_date and leave_period_end <= end_date:
+                    taken += balance or Decimal('0.00')
+            return taken
+        return HrmMonthly.objects.filter(
+            employee=self.employee,
+            leave_period_start__gte=start_date,
+            leave_period_end__lte=end_date).aggregate(taken=Sum('balance'))['taken'] or taken
+
+    def leave_days(self, start_date, end_date):
+        """Returns a dictionary of the pending approval, scheduled and taken days of the
+        employee's HrmMonthly rows from start_date to end_date, summed in one query."""
+        days = HrmMonthly.objects.filter(
+            employee=self.employee,
+            leave_period_start__gte=start_date,
+            leave_period_end__lte=end_date).aggregate(**{field: Sum(field) for field in STATUS_FIELDS})
+        return {field: value or Decimal('0.00') for field, value in days.items()}
+
+    @classmethod
+    def leave_days_by_employee(cls, start_date, end_date):
+        """Returns a dictionary of {employee_id: {field: days}} of the pending approval,
+        scheduled and taken days from start_date to end_date summed in one grouped query."""
+        days = {}
+        for row in HrmMonthly.objects.filter(
                 leave_period_start__gte=start_date,
-                leave_period_end__lte=end_date):
-            taken += hrm_monthly.balance or Decimal('0.00')
+                leave_period_end__lte=end_date).values('employee_id').annotate(
+                    **{field: Sum(field) for field in STATUS_FIELDS}).order_by():
+            days[row['employee_id']] = {field: row[field] or Decimal('0.00') for field in STATUS_FIELDS}
+        return days
+
+    @classmethod
+    def taken_by_employee(cls):
+        """Returns a dictionary of {employee_id: [(leave_period_start, leave_period_end, balance), ...]}
+        summed in one grouped query."""
+        taken = {}
+        for row in HrmMonthly.objects.values(
+                'employee_id', 'leave_period_start', 'leave_period_end').annotate(
+                    balance=Sum('balance')).order_by():
+            taken.setdefault(row['employee_id'], []).append(
+                (row['leave_period_start'], row['leave_period_end'], row['balance']))
         return taken
 
     @classmethod
     def summarize_all(cls, reference_date, opening_balance_date):
+        """Returns a Summarize instance per employee, loading opening balances and
+        taken days for all employees up front so the query count does not grow with headcount."""
         summarize_all = {}
         missing_opening_balance = {}
+        opening_balances = {}
+        for opening_balance in OpeningBalances.objects.all().order_by('pk'):
+            opening_balances.setdefault(opening_balance.employee_id, opening_balance)
+        taken = cls.taken_by_employee()
         for employee in Employee.objects.all().order_by('employee_number'):
             try:
-                summary = cls(employee, reference_date)
-            except OpeningBalances.DoesNotExist:
+                opening_balance = opening_balances[employee.pk]
+            except KeyError:
                 summary = (employee, employee.joined.strftime('%Y-%m-%d'))
                 if employee.joined <= opening_balance_date and not employee.termination_date:
                     missing_opening_balance.update({
                         employee.employee_number: (employee, employee.joined.strftime('%Y-%m-%d'))})
+            else:
+                summary = cls(employee, reference_date, opening_balance=opening_balance,
+                              taken=taken.get(employee.pk, []))
             summarize_all.update({employee.employee_number: summary})
         return summarize_all, missing_opening_balance
 
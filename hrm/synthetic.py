@@ -0,0 +1,176 @@
+import csv
+import os
+import random
+
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+
+FIRSTNAMES = [
+    'Alan', 'Bill', 'Chris', 'Jon', 'Pat', 'Patrick', 'Rick', 'Steve', 'Tony', 'Kabo',
+    'Neo', 'Mpho', 'Thato', 'Lesego', 'Kagiso', 'Boitumelo', 'Onalenna', 'Tebogo', 'Masego', 'Kefilwe',
+    'Tshepo', 'Naledi', 'Goitseone', 'Refilwe', 'Mothusi', 'Keabetswe', 'Oratile', 'Dineo', 'Gaone', 'Kelebogile',
+]
+SYLLABLES = [
+    'mo', 'ra', 'ka', 'se', 'tho', 'le', 'bo', 'ga', 'ne', 'tla',
+    'ma', 'di', 'ko', 'pe', 'tsa', 'wa', 'na', 'lo', 'fe', 'ru',
+]
+LOCATIONS = [
+    ('Mpepu Gaborone', 'MPEPU'), ('', 'CTU- Molepolole '), ('Laboratory', 'Lab - Gaborone'),
+    ('CTU Gaborone', 'CTU- Gaborone'), ('Data Management', 'DMC - Headquarters'),
+    ('Early Infant Treatment', 'Tshipidi- Gaborone'),
+]
+JOB_TITLES = ['Study Coordinator-Physician', 'DRIVER', 'Recruitment Officer', 'Systems Developer / Analyst',
+              'Office Assistant', 'Research Nurse', 'Laboratory Technician']
+LEAVE_TYPES = ['Annual Leave'] * 8 + ['Sick Leave', 'Maternity Leave']
+SIZES = [1000, 10000, 100000, 1000000]
+
+
+class SyntheticEmployee(object):
+
+    def __init__(self, employee_number, firstname, lastname, joined, termination_date, subunit, location,
+                 job_title, opening_balance):
+        self.employee_number = employee_number
+        self.firstname = firstname
+        self.lastname = lastname
+        self.joined = joined
+        self.termination_date = termination_date
+        self.subunit = subunit
+        self.location = location
+        self.job_title = job_title
+        self.opening_balance = opening_balance
+
+    @property
+    def name(self):
+        name = '{} {}'.format(self.firstname, self.lastname)
+        if self.termination_date:
+            name += ' (Past Employee)'
+        return name
+
+
+class SyntheticData(object):
+    """Writes employee, opening balance, HRM usage, leave list and VIP files in the column
+    layouts of the real exports, with the file names expected by load.load_all.
+
+        SyntheticData(employees=10000, seed=1).write('~/bench/10000')
+
+    Every employee has a unique first and last name, a row in the employee, opening balance
+    and HRM usage files and in each VIP file. The leave list has `leave_rows` rows, by
+    default as many as employees, for the leave list month. Some names have the double
+    spaces and '(Past Employee)' suffixes found in the real files and some leave list names
+    have a middle name.
+
+    VIP files are written for `periods`, a list of (month, year), by default only the
+    leave list month."""
+
+    def __init__(self, employees=1000, leave_rows=None, year=2015, month=8, periods=None, seed=None):
+        self.random = random.Random(seed)
+        self.year = year
+        self.month = month
+        self.periods = periods or [(month, year)]
+        self.leave_rows = employees if leave_rows is None else leave_rows
+        self.opening_date = date(2014, 12, 31)
+        self.employees = [self.employee(i) for i in range(employees)]
+
+    def lastname(self, n):
+        syllables = []
+        while n or len(syllables) < 2:
+            n, i = divmod(n, len(SYLLABLES))
+            syllables.append(SYLLABLES[i])
+        return ''.join(syllables).capitalize()
+
+    def employee(self, i):
+        rand = self.random
+        joined = date(2004, 1, 1) + timedelta(days=rand.randint(0, 365 * 11))
+        termination_date = None
+        if rand.random() < 0.1:
+            termination_date = joined + timedelta(days=rand.randint(30, 365 * 3))
+            if termination_date >= date(self.year, self.month, 1):
+                termination_date = None
+        subunit, location = rand.choice(LOCATIONS)
+        return SyntheticEmployee(
+            employee_number=i + 1,
+            firstname=FIRSTNAMES[i % len(FIRSTNAMES)],
+            lastname=self.lastname(i // len(FIRSTNAMES)),
+            joined=joined,
+            termination_date=termination_date,
+            subunit=subunit,
+            location=location,
+            job_title=rand.choice(JOB_TITLES),
+            opening_balance=round(rand.uniform(0, 40), 2),
+        )
+
+    def spelling(self, employee, middlename=False):
+        """Returns the employee's name with the occasional variant found in the real files."""
+        r = self.random.random()
+        if r < 0.02:
+            return '{}  {}'.format(employee.firstname, employee.lastname)
+        if middlename and r < 0.04:
+            return '{} {} {}'.format(employee.firstname, self.random.choice(FIRSTNAMES), employee.lastname)
+        return employee.name
+
+    def write(self, path):
+        """Writes all files to path, creating it if needed, and returns a list of the filenames."""
+        path = os.path.expanduser(path)
+        os.makedirs(path, exist_ok=True)
+        filenames = [
+            self.write_file(path, 'employee.csv', self.employee_rows()),
+            self.write_file(path, 'opening201412.csv', self.opening_balance_rows()),
+            self.write_file(path, 'hrm_usage{0}{1:02d}.csv'.format(self.year, self.month), self.hrm_usage_rows()),
+            self.write_file(path, 'leave_list{0}{1:02d}.csv'.format(self.year, self.month), self.leave_list_rows()),
+        ]
+        for month, year in self.periods:
+            filenames.append(self.write_file(path, 'vip{0}{1:02d}.csv'.format(year, month), self.vip_rows()))
+        return filenames
+
+    def write_file(self, path, filename, rows):
+        filename = os.path.join(path, filename)
+        with open(filename, 'w', encoding='latin-1', newline='') as f:
+            csv.writer(f).writerows(rows)
+        return filename
+
+    def employee_rows(self):
+        yield ['Employee Id', 'Employee Last Name', 'Employee First Name', 'Job Title', 'Employment Status',
+               'Joined Date', 'Sub Unit', 'Location', 'Termination Date']
+        for e in self.employees:
+            yield ['{:04d}'.format(e.employee_number), e.lastname, e.firstname, e.job_title, 'Contract',
+                   e.joined.strftime('%Y-%m-%d'), e.subunit, e.location,
+                   e.termination_date.strftime('%Y-%m-%d') if e.termination_date else '']
+
+    def opening_balance_rows(self):
+        yield ['Code Lastname', 'Firstname', 'Joined', ' Balance']
+        for e in self.employees:
+            if e.joined <= self.opening_date:
+                yield [e.employee_number, e.lastname, e.firstname,
+                       '{}/{}/{}'.format(e.joined.day, e.joined.month, e.joined.strftime('%y')),
+                       e.opening_balance]
+
+    def hrm_usage_rows(self):
+        yield ['Employee Name', 'Leave Period', 'Entitlements', 'Pending Approval', 'Scheduled', 'Taken',
+               'Available Balance', 'Overdrawn']
+        for e in self.employees:
+            start = date(self.year, e.joined.month, 1)
+            if start > date(self.year, self.month, 1):
+                start -= relativedelta(years=1)
+            end = start + relativedelta(years=1, days=-1)
+            pending, scheduled, taken = [self.random.choice([0, 0, 1, 2, 3.5, 5]) for _ in range(3)]
+            entitlements = 22
+            yield [self.spelling(e), '{}-{}'.format(end.strftime('%Y/%m/%d'), start.strftime('%Y/%m/%d')),
+                   entitlements, pending, scheduled, taken, entitlements - pending - scheduled - taken, 0]
+
+    def leave_list_rows(self):
+        yield ['Date', 'Employee Name', 'Leave Type', 'Number of Days', 'Status', 'Comments']
+        days = (date(self.year, self.month, 1) + relativedelta(months=1, days=-1)).day
+        employees = [e for e in self.employees if not e.termination_date] or self.employees
+        for _ in range(self.leave_rows):
+            e = self.random.choice(employees)
+            number_of_days = self.random.choice([0.5, 1, 1, 2, 3, 5])
+            status = self.random.choice(['Taken', 'Scheduled', 'Pending Approval'])
+            yield ['{}/{}/{}'.format(self.random.randint(1, days), self.month, str(self.year)[2:]),
+                   self.spelling(e, middlename=True), self.random.choice(LEAVE_TYPES), number_of_days,
+                   '{}({:.4f}) '.format(status, number_of_days), '']
+
+    def vip_rows(self):
+        yield ['Employee Code', 'Employee', 'Leave Balance']
+        for e in self.employees:
+            yield [e.employee_number, 'Mr {} {}'.format(e.firstname[0], e.lastname),
+                   round(self.random.uniform(-2, 40), 2)]
@@ -0,0 +1,64 @@
+import json
+import shutil
+import tempfile
+
+from django.test.testcases import TestCase
+
+from hrm.benchmark import Benchmark
+from hrm.instrumentation import QueryCounter
+from hrm.load import load_employee, load_hrm_monthly, load_hrm_usage, load_opening_balances, load_vip_monthly
+from hrm.models import Employee, Hrm, HrmMonthly, OpeningBalances, VipMonthly
+from hrm.synthetic import SyntheticData
+
+
+class TestBenchmark(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_query_counter(self):
+        """Asserts QueryCounter counts the same queries as assertNumQueries and nests."""
+        with self.assertNumQueries(3):
+            with QueryCounter() as outer:
+                Employee.objects.count()
+                with QueryCounter() as inner:
+                    list(Employee.objects.all())
+                    Employee.objects.filter(lastname='Moraz').delete()
+        self.assertEqual(outer.count, 3)
+        self.assertEqual(inner.count, 2)
+        self.assertEqual(inner.statements['SELECT'], 2)
+
+    def test_synthetic_data_loads(self):
+        """Asserts every synthetic file loads with the real readers and resolves each employee."""
+        data = SyntheticData(employees=200, seed=1)
+        self.assertEqual(len(data.write(self.path)), 5)
+        load_employee(self.path)
+        self.assertEqual(Employee.objects.count(), 200)
+        load_opening_balances(self.path)
+        self.assertEqual(Employee.objects.count(), 200)
+        self.assertEqual(OpeningBalances.objects.count(),
+                         len([e for e in data.employees if e.joined <= data.opening_date]))
+        load_hrm_usage(self.path)
+        self.assertEqual(Hrm.objects.count(), 200)
+        load_vip_monthly(self.path, periods=data.periods)
+        self.assertEqual(VipMonthly.objects.count(), 200)
+        load_hrm_monthly(self.path, 2015, 8)
+        self.assertTrue(HrmMonthly.objects.exists())
+
+    def test_benchmark_run(self):
+        """Asserts a benchmark run records each step, saves JSON and leaves the database unchanged."""
+        benchmark = Benchmark(100, path=self.path, seed=2).run()
+        with open(benchmark.save()) as f:
+            results = json.load(f)
+        self.assertEqual(results['rows'], 100)
+        self.assertEqual([step['name'] for step in results['steps']], [
+            'generate', 'employees', 'resolver', 'opening_balances', 'hrm_usage', 'leave_list', 'vip',
+            'summarize_all', 'balances'])
+        steps = {step['name']: step for step in results['steps']}
+        self.assertEqual(steps['resolver']['queries'], 1)
+        self.assertEqual(steps['summarize_all']['queries'], 3)
+        self.assertGreater(steps['employees']['peak_memory'], 0)
+        self.assertFalse(Employee.objects.exists())
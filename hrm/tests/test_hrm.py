@@ -1,18 +1,35 @@
+import importlib
 import io
 import csv
+import json
+import os
+import shutil
+import tempfile
 
 from collections import OrderedDict
 from datetime import date, datetime
 from decimal import Decimal
 from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
+from django.apps import apps
+from django.core.management import call_command
 from django.test.testcases import TestCase
 
-from hrm.models import Hrm, VipMonthly, HrmMonthly, Employee, OpeningBalances
+from hrm.balances import BalanceCube, recompute
+from hrm.dates import DateParser
+from hrm.load import PERIODS, load_all, load_readers
+from hrm.matching import NameMatcher, levenshtein, soundex
+from hrm.parallel import load_parallel
+from hrm.models import (
+    Hrm, VipMonthly, HrmMonthly, Employee, EmployeeAlias, OpeningBalances, Balances, LoadJournal, FileRegistry)
 from hrm.readers import HrmUsageReportReader, VipMonthlyReader, HrmMonthlyReader, EmployeeReader
 from hrm.summary import Summarize
-from hrm.readers import OpeningBalancesReader
+from hrm.readers import EmployeesFinanceReader, OpeningBalancesReader
+from hrm.registry import fingerprint
 from hrm.reports import Employees
+from hrm.resolver import EmployeeResolver, alias_key
+from hrm.staging import StagingError, StagingTable
+from hrm.status import add_status, parse_status
 
 
 class DummySummarize(Summarize):
@@ -21,7 +38,7 @@ class DummySummarize(Summarize):
         pass
 
 
-class TestHrm(TestCase):
+class HrmTestCase(TestCase):
 
     opening_balances = (
         'Code Lastname,Firstname,Joined, Balance\n'
@@ -62,6 +79,15 @@ class TestHrm(TestCase):
         '25/8/15,Bill Bruford,Annual Leave,2,Scheduled(1.0000) Taken(1.0000) ,\n'
     )
 
+    hrm_usage_data = (
+        'Employee Name,Leave Period,Entitlements,Pending Approval,Scheduled,Taken,Available Balance,Overdrawn\n'
+        'Patrick Moraz,2015/11/30-2014/12/01,22,0,2,5,15,0\n'
+        'Bill Bruford,2015/11/30-2014/12/01,22,1,0,10,11,0\n'
+        'Jon  Anderson,2015/11/30-2014/12/01,22,0,4,0,18,0\n'
+        'Rick Wakeman,2015/11/30-2014/12/01,22,0,0,0,22,0\n'
+        'Steve Howe,2015/11/30-2014/12/01,20,0,3,2.5,14.5,0\n'
+    )
+
     employee_data = (
         '"Employee Id","Employee Last Name","Employee First Name","Job Title","Employment Status","Joined Date","Sub Unit",Location,"Termination Date"\n'
         '573,Moraz,Patrick,"Study Coordinator-Physician",Contract,2011-02-14,"Mpepu Gaborone",MPEPU,\n'
@@ -106,6 +132,9 @@ class TestHrm(TestCase):
         reader = VipMonthlyReader(filename=None, month=8, year=2015, file_object=csvfile)
         reader.load()
 
+
+class TestHrm(HrmTestCase):
+
     def test_employee_file_object(self):
         self.load_employees_from_file_object()
         self.assertEqual(Employee.objects.all().count(), 8)
@@ -301,3 +330,725 @@ class TestHrm(TestCase):
                 print(end_date.strftime('%Y-%m-%d'), employee.employee_number, employee.lastname,
                       period_start.strftime('%Y-%m-%d'),
                       period_end.strftime('%Y-%m-%d'))
+
+
+class TestDateParser(TestCase):
+
+    def test_date_parser(self):
+        """Asserts the date parser detects the file format, agrees with dateutil and memoizes."""
+        dates = DateParser(dayfirst=True)
+        values = ['10/8/15', '6/8/15', '20/8/15', '31/8/15', '26/8/15', '13/8/15', ' 13/8/15', '1/9/15', 'Aug 3 2015']
+        for value in values:
+            self.assertEqual(dates.parse(value), parse(value, dayfirst=True), value)
+        self.assertEqual(dates.format, '%d/%m/%y')
+        self.assertEqual(dates.fallbacks, 1)
+        self.assertEqual(len(dates.cache), len(values))
+        dates = DateParser()
+        for value in ['2011-02-14', '2013-08-12', '2014-10-01', '2004-01-01', '2012-09-01', '2007-10-01']:
+            self.assertEqual(dates.parse(value), parse(value), value)
+        self.assertEqual(dates.format, '%Y-%m-%d')
+        self.assertEqual(DateParser(dayfirst=True).parse(' 14/2/11'), datetime(2011, 2, 14))
+
+    def test_date_parser_ambiguous_format(self):
+        """Asserts samples that match both day and month first formats detect the one of dayfirst."""
+        for dayfirst, expected in [(False, datetime(2015, 3, 4)), (True, datetime(2015, 4, 3))]:
+            dates = DateParser(dayfirst=dayfirst)
+            for value in ['01/01/2015', '02/02/2015', '05/05/2015', '07/07/2015', '12/12/2015', '03/04/2015']:
+                dates.parse(value)
+            self.assertEqual(dates.format, '%m/%d/%Y' if not dayfirst else '%d/%m/%Y')
+            self.assertEqual(dates.parse('03/04/2015'), expected)
+            self.assertEqual(dates.fallbacks, 0)
+
+
+class TestEmployeeSync(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_employee_sync(self):
+        """Asserts EmployeeReader in sync mode keeps dependent rows and only writes changes."""
+        self.load_openingbalances_from_file_object()
+        pks = dict(Employee.objects.values_list('employee_number', 'pk'))
+        data = self.employee_data.replace(
+            '0784,Howe,Steve,"Recruitment Officer",Contract,2013-11-04,"Mpepu Gaborone",MPEPU,\n',
+            '0784,Howe,Steve,"Recruitment Officer",Contract,2013-11-04,"Mpepu Gaborone",MPEPU,2015-08-31\n')
+        data = data.replace('"Data Management"', '"Data Services"')
+        data = data + '0999,Wakeman,Rick,Keyboards,Contract,2015-01-05,,Lab,\n'
+        reader = EmployeeReader(filename=None, file_object=io.StringIO(data), sync=True)
+        reader.load()
+        self.assertEqual(Employee.objects.all().count(), 9)
+        self.assertEqual(OpeningBalances.objects.all().count(), 4)
+        self.assertEqual([e.employee_number for e in reader.created], [999])
+        self.assertEqual(sorted(e.employee_number for e in reader.updated), [644, 784])
+        self.assertEqual([e.employee_number for e in reader.terminated], [784])
+        self.assertEqual(Employee.objects.get(employee_number=784).termination_date, date(2015, 8, 31))
+        self.assertEqual(Employee.objects.get(employee_number=644).subunit, 'Data Services')
+        for employee_number, pk in pks.items():
+            self.assertEqual(Employee.objects.get(employee_number=employee_number).pk, pk)
+        reader = EmployeeReader(filename=None, file_object=io.StringIO(data), sync=True)
+        reader.load()
+        self.assertEqual((reader.created, reader.updated), ([], []))
+
+
+class TestEmployeeResolver(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_employee_resolver(self):
+        """Asserts the resolver is built with one query and matches by number and name."""
+        with self.assertNumQueries(1):
+            resolver = EmployeeResolver()
+        self.assertEqual(len(resolver), 8)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.number('0906').lastname, 'Metheny')
+            self.assertEqual(resolver.name('Bruford', 'Bill', None).employee_number, 153)
+            self.assertEqual(resolver.name('Anderson', 'Jon', match_middlename=False).employee_number, 644)
+            self.assertEqual(resolver.name('Kaye', 'Tony', strippedname='TonyKaye').employee_number, 785)
+            self.assertIsNone(resolver.name('Wakeman', 'Rick', strippedname='RickWakeman'))
+
+    def test_opening_balances_adds_to_resolver(self):
+        """Asserts an employee auto-created by OpeningBalancesReader is added to the shared resolver."""
+        resolver = EmployeeResolver()
+        csvfile = io.StringIO('Code Lastname,Firstname,Joined, Balance\n999,Wakeman,Rick,01/01/14,2.0\n')
+        reader = OpeningBalancesReader(
+            filename=None, balance_date=date(2014, 12, 31), file_object=csvfile, resolver=resolver)
+        reader.load()
+        self.assertEqual(resolver.number(999).lastname, 'Wakeman')
+        self.assertTrue(resolver.number(999).manually_added)
+
+    def test_verify_employee_learns_alias(self):
+        """Asserts a confirmed soft match is saved as an alias that later loads resolve first."""
+        self.assertEqual(alias_key('Jon  Anderson (Past Employee)'), 'anderson jon')
+        filetext = 'Number,Name\n153,Bill Brueford\n573,Pat Moraz\n'
+        employee = EmployeeReader(filename=None, file_object=io.StringIO(filetext))
+        employee.verify_employees(0, 1, source='hrm_usage')
+        self.assertEqual(list(employee.soft_match), ['153'])
+        alias = EmployeeAlias.objects.get()
+        self.assertEqual((alias.source, alias.key, alias.employee.employee_number), ('hrm_usage', 'bill brueford', 153))
+        employee = EmployeeReader(filename=None, file_object=io.StringIO(filetext))
+        employee.verify_employees(0, 1, source='hrm_usage')
+        self.assertEqual(employee.soft_match, {})
+        csvfile = io.StringIO(
+            'Employee Name,Leave Period,Entitlements,Pending Approval,Scheduled,Taken,Available Balance,Overdrawn\n'
+            'Bill  Brueford (Past Employee),2015/11/30-2014/12/01,22,1,0,10,11,0\n')
+        HrmUsageReportReader(filename=None, month=8, year=2015, file_object=csvfile).load()
+        self.assertEqual(Hrm.objects.get().employee.employee_number, 153)
+        self.assertIsNone(EmployeeResolver().alias('leave_list', 'Bill Brueford'))
+
+    def test_verify_employee_learns_only_clear_aliases(self):
+        """Asserts soft matches close to another employee or spelling another employee's name
+        are reported but not learned."""
+        for employee_number, firstname, lastname in [
+                (901, 'Tebogo', 'Kgosi'), (902, 'Kgosi', 'Tebogo'),
+                (903, 'Kabo', 'Mothibedi'), (904, 'Kabo', 'Mothibeli')]:
+            Employee.objects.create(
+                employee_number=employee_number, firstname=firstname, lastname=lastname, joined=date(2015, 1, 1))
+        filetext = 'Number,Name\n901,Tebogo KGOSI\n903,Kabo Mothibedii\n153,Bill Brueford\n'
+        employee = EmployeeReader(filename=None, file_object=io.StringIO(filetext))
+        employee.verify_employees(0, 1, source='hrm_usage')
+        self.assertEqual(sorted(employee.soft_match), ['153', '901', '903'])
+        self.assertEqual(list(EmployeeAlias.objects.values_list('key', flat=True)), ['bill brueford'])
+        resolver = EmployeeResolver()
+        self.assertIsNone(resolver.alias('hrm_usage', 'Kgosi Tebogo'))
+        self.assertEqual(resolver.name('Tebogo', 'Kgosi').employee_number, 902)
+
+
+class TestNameMatcher(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_verify_employee_soft_match(self):
+        """Asserts a misspelled surname with a known employee number is a scored soft match."""
+        csvfile = io.StringIO('Number,Name\n153,Bill Brueford\n999,Rick Wakeman\n')
+        employee = EmployeeReader(filename=None, file_object=csvfile)
+        missing = employee.verify_employees(0, 1)
+        self.assertEquals(missing, {'999': 'Rick Wakeman'})
+        self.assertEqual(employee.soft_match['153'][1:], ['153 Bruford Bill (0.88)', '153 Bruford Bill'])
+
+    def test_name_matcher(self):
+        """Asserts names are blocked by soundex and trigrams and ranked by score."""
+        self.assertEqual(soundex('Robert'), 'R163')
+        self.assertEqual(soundex('Ashcraft'), 'A261')
+        self.assertEqual(levenshtein('Metheny', 'Methenny'), 1)
+        Employee.objects.create(employee_number=786, lastname='Howes', firstname='Simon', joined=date(2015, 1, 1))
+        matcher = NameMatcher()
+        self.assertEqual([m.employee.employee_number for m in matcher.match('METHENEY')], [906])
+        self.assertEqual([m.employee.employee_number for m in matcher.match('Howe')], [784, 786])
+        self.assertEqual(matcher.best('Howe', 'S')[0].employee_number, 784)
+        self.assertEqual(matcher.best('Howes', 'S')[0].employee_number, 786)
+        self.assertEqual(matcher.match('Wakeman'), [])
+
+    def test_employees_finance_reader(self):
+        """Asserts payroll names resolve by surname and initial and report ambiguous or missing names."""
+        Employee.objects.create(employee_number=786, lastname='Howe', firstname='Simon', joined=date(2015, 1, 1))
+        csvfile = io.StringIO('Name,Amount\nMORAZ P.,1\nMORAZ P.,2\nANDERSSON J,3\nHOWE S.,4\nWAKEMAN R.,5\n')
+        reader = EmployeesFinanceReader(filename=None, file_object=csvfile)
+        self.assertEqual(reader.employees['MORAZ P.'].employee_number, 573)
+        self.assertEqual(reader.employees['ANDERSSON J'].employee_number, 644)
+        self.assertIsNone(reader.employees['HOWE S.'])
+        self.assertEqual(len(reader.ambiguous['HOWE S.']), 2)
+        self.assertEqual(reader.missing, ['WAKEMAN R.'])
+
+
+class TestHrmUsageReader(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_import_hrm_usage_in_batches(self):
+        """Asserts HrmUsageReportReader writes every resolved row, in chunks, with hrm_balance set."""
+        csvfile = io.StringIO(self.hrm_usage_data)
+        reader = HrmUsageReportReader(filename=None, month=8, year=2015, file_object=csvfile, batch_size=2)
+        batches = []
+        write_batch = reader.write_batch
+        reader.write_batch = lambda batch: batches.append(len(batch)) or write_batch(batch)
+        reader.load()
+        self.assertEqual(batches, [2, 2])
+        self.assertEqual(reader.rows_written, 4)
+        self.assertEqual(Hrm.objects.all().count(), 4)
+        self.assertEqual(Hrm.objects.get(employee__employee_number=153).hrm_balance, Decimal('11.00'))
+        self.assertEqual(Hrm.objects.get(employee__employee_number=784).hrm_balance, Decimal('14.50'))
+        self.assertEqual(Hrm.objects.get(employee__employee_number=784).leave_period_start, date(2014, 12, 1))
+
+    def test_import_hrm_usage_replaces_report_month(self):
+        """Asserts reloading a report month replaces its rows, in every mode, and loading
+        another month keeps them."""
+        for delta in [False, False, True]:
+            HrmUsageReportReader(
+                filename=None, month=8, year=2015, file_object=io.StringIO(self.hrm_usage_data), delta=delta).load()
+            self.assertEqual(Hrm.objects.count(), 4)
+        data = self.hrm_usage_data.replace(
+            'Bill Bruford,2015/11/30-2014/12/01,22,1,0,10,11,0', 'Bill Bruford,2015/11/30-2014/12/01,22,1,0,8,13,0')
+        for delta in [False, True]:
+            HrmUsageReportReader(
+                filename=None, month=7, year=2015, file_object=io.StringIO(data), delta=delta).load()
+            self.assertEqual(Hrm.objects.count(), 8)
+        self.assertEqual(dict(Hrm.objects.filter(employee__employee_number=153).values_list(
+            'report_month', 'hrm_balance')), {date(2015, 7, 1): Decimal('13.00'), date(2015, 8, 1): Decimal('11.00')})
+        HrmUsageReportReader(filename=None, month=8, year=2015, file_object=io.StringIO(data)).load()
+        self.assertEqual(Hrm.objects.count(), 8)
+        self.assertEqual(Hrm.objects.filter(employee__employee_number=153, hrm_balance=Decimal('13.00')).count(), 2)
+
+    def test_import_hrm_usage_delta(self):
+        """Asserts HrmUsageReportReader in delta mode writes only the rows that differ and
+        keeps vip_balance."""
+        csvfile = io.StringIO(self.hrm_usage_data)
+        HrmUsageReportReader(filename=None, month=8, year=2015, file_object=csvfile).load()
+        self.load_vip_from_file_object()
+        pks = dict(Hrm.objects.values_list('employee__employee_number', 'pk'))
+        data = self.hrm_usage_data.replace(
+            'Bill Bruford,2015/11/30-2014/12/01,22,1,0,10,11,0', 'Bill Bruford,2015/11/30-2014/12/01,22,1,0,12,9,0')
+        data = data.replace('Steve Howe,2015/11/30-2014/12/01,20,0,3,2.5,14.5,0\n', '')
+        data = data + 'Chris Squire,2015/11/30-2014/12/01,22,0,0,0,22,0\n'
+        reader = HrmUsageReportReader(filename=None, month=8, year=2015, file_object=io.StringIO(data), delta=True)
+        reader.load()
+        self.assertEqual(([hrm.employee.employee_number for hrm in reader.created],
+                          [hrm.employee.employee_number for hrm in reader.updated],
+                          [hrm.employee.employee_number for hrm in reader.deleted]), ([55], [153], [784]))
+        self.assertEqual(reader.rows_written, 2)
+        self.assertEqual(reader.dirty, {})
+        hrm = Hrm.objects.get(employee__employee_number=153)
+        self.assertEqual((hrm.pk, hrm.taken, hrm.hrm_balance, hrm.vip_balance),
+                         (pks[153], Decimal('12.00'), Decimal('9.00'), Decimal('3.17')))
+        self.assertEqual(dict(Hrm.objects.values_list('employee__employee_number', 'vip_balance')), {
+            573: Decimal('13.30'), 153: Decimal('3.17'), 644: Decimal('0.00'), 55: Decimal('0.00')})
+        reader = HrmUsageReportReader(filename=None, month=8, year=2015, file_object=io.StringIO(data), delta=True)
+        report = reader.load()
+        self.assertEqual((report.rows_read, report.rows_written, reader.deleted), (5, 0, []))
+        self.assertEqual(report.stages['write']['queries'], 2)
+
+
+class TestStaging(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_staging_load(self):
+        """Asserts staged loads publish the same rows as direct loads and replace the rows
+        loaded before from the same file."""
+        csvfile = io.StringIO(self.hrm_usage_data)
+        HrmUsageReportReader(filename=None, month=8, year=2015, file_object=csvfile).load()
+        expected = sorted(Hrm.objects.values_list('employee__employee_number', 'taken', 'hrm_balance'))
+        data = self.hrm_usage_data.replace(
+            'Bill Bruford,2015/11/30-2014/12/01,22,1,0,10,11,0', 'Bill Bruford,2015/11/30-2014/12/01,22,1,0,12,9,0')
+        reader = HrmUsageReportReader(filename=None, month=8, year=2015, file_object=io.StringIO(data))
+        reader.use_staging_table = True
+        report = reader.load()
+        self.assertEqual(report.rows_written, 4)
+        self.assertIn('staging_table', report.stages)
+        expected[0] = (153, Decimal('12.00'), Decimal('9.00'))
+        self.assertEqual(sorted(Hrm.objects.values_list('employee__employee_number', 'taken', 'hrm_balance')),
+                         expected)
+        for month in [7, 8, 8]:
+            reader = VipMonthlyReader(filename=None, month=month, year=2015,
+                                      file_object=io.StringIO(self.vip_monthly_data))
+            reader.use_staging_table = month == 8
+            reader.load()
+        self.assertEqual(reader.rows_written, 4)
+        self.assertEqual(VipMonthly.objects.count(), 8)
+        self.assertEqual(dict(VipMonthly.objects.filter(transaction_date=date(2015, 8, 31)).values_list(
+            'employee__employee_number', 'balance')), {
+            573: Decimal('13.30'), 153: Decimal('3.17'), 906: Decimal('4.17'), 784: Decimal('13.67')})
+        self.assertEqual(dict(Hrm.objects.values_list('employee__employee_number', 'vip_balance')), {
+            573: Decimal('26.60'), 153: Decimal('6.34'), 644: Decimal('0.00'), 784: Decimal('27.34')})
+
+    def test_staging_reload(self):
+        """Asserts a staged reload replaces the rows of the report month or period loaded before,
+        keeps those of other months and deletes nothing until it publishes."""
+        for month in [7, 8, 8]:
+            reader = HrmUsageReportReader(
+                filename=None, month=month, year=2015, file_object=io.StringIO(self.hrm_usage_data))
+            reader.use_staging_table = True
+            reader.load()
+        self.assertEqual(Hrm.objects.filter(report_month=date(2015, 8, 1)).count(), 4)
+        self.assertEqual(Hrm.objects.count(), 8)
+        for month in [7, 8, 8]:
+            reader = VipMonthlyReader(filename=None, month=month, year=2015,
+                                      file_object=io.StringIO(self.vip_monthly_data))
+            reader.use_staging_table = True
+            reader.load()
+        for _ in range(2):
+            reader = HrmMonthlyReader(
+                filename=None, file_object=io.StringIO(self.hrm_monthly_data), month=8, year=2015)
+            reader.use_staging_table = True
+            reader.load()
+        self.assertEqual(VipMonthly.objects.count(), 8)
+        self.assertEqual(VipMonthly.objects.get(
+            employee__employee_number=153, transaction_date=date(2015, 8, 31)).balance, Decimal('3.17'))
+        self.assertEqual(set(Hrm.objects.values_list('employee__employee_number', 'vip_balance')), {
+            (573, Decimal('26.60')), (153, Decimal('6.34')), (644, Decimal('0.00')), (784, Decimal('27.34'))})
+        self.assertEqual(HrmMonthly.objects.get(employee__employee_number=153).status,
+                         'Scheduled(8.0000) Taken(10.0000)')
+        self.assertEqual(sum(HrmMonthly.objects.values_list('balance', flat=True)), Decimal('39.00'))
+        reader = VipMonthlyReader(filename=None, month=8, year=2015, file_object=io.StringIO(self.vip_monthly_data))
+        reader.use_staging_table = True
+        reader.pre_load()
+        self.assertEqual(VipMonthly.objects.count(), 8)
+
+    def test_staging_table_validates(self):
+        """Asserts StagingTable raises StagingError if the rows or totals staged are not those
+        expected and publishes nothing."""
+        rows = list(HrmUsageReportReader(filename=None, month=8, year=2015).rows(io.StringIO(self.hrm_usage_data)))
+        with StagingTable(Hrm) as staging:
+            staging.insert(rows)
+            staging.validate(4, {'taken': Decimal('17.5')})
+            self.assertRaises(StagingError, staging.validate, 5)
+            self.assertRaises(StagingError, staging.validate, 4, {'taken': Decimal('17.4')})
+        self.assertEqual(Hrm.objects.count(), 0)
+
+
+class TestHrmMonthlyReader(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_import_hrm_monthly_aggregate_matches_row_level(self):
+        """Asserts the aggregating load gives the same rows as the row-by-row load."""
+        results = []
+        for aggregate in [False, True]:
+            HrmMonthly.objects.all().delete()
+            for _ in range(0, 2):
+                csvfile = io.StringIO(self.hrm_monthly_data + self.bruford_hrm_monthly_data.split('\n', 1)[1])
+                reader = HrmMonthlyReader(filename=None, file_object=csvfile, aggregate=aggregate)
+                reader.load()
+            results.append(list(HrmMonthly.objects.order_by('employee', 'transaction_date').values_list(
+                'employee', 'transaction_date', 'leave_period_start', 'leave_period_end', 'fullname', 'balance',
+                'status', 'pending_approval', 'scheduled', 'taken')))
+        self.assertEqual(len(results[0]), 13)
+        self.assertEqual(results[0], results[1])
+
+    def test_import_hrm_monthly_status_components(self):
+        """Asserts HrmMonthlyReader stores the days of each status component, rebuilds the
+        status of aggregated rows and that the components are summed in SQL."""
+        self.assertEqual(parse_status('Scheduled(8.0000) Taken(10.0000) '), {
+            'pending_approval': Decimal('0'), 'scheduled': Decimal('8'), 'taken': Decimal('10')})
+        self.assertEqual(add_status('Taken(1.5) Pending Approval(2) Cancelled(1)'),
+                         'Pending Approval(2.0000) Taken(1.5000) Cancelled(1.0000)')
+        self.assertEqual(add_status('Taken(1.0000) Cancelled(1.0000)', 'Cancelled (0.5) Scheduled(2) Rejected(1)'),
+                         'Scheduled(2.0000) Taken(1.0000) Cancelled(1.5000) Rejected(1.0000)')
+        self.load_openingbalances_from_file_object()
+        reader = HrmMonthlyReader(filename=None, file_object=io.StringIO(self.hrm_monthly_data))
+        reader.load()
+        rows = HrmMonthly.objects.values_list('employee__employee_number', 'status', 'pending_approval', 'scheduled',
+                                              'taken')
+        self.assertEqual(sorted(rows), [
+            (153, 'Scheduled(8.0000) Taken(10.0000)', Decimal('0.00'), Decimal('8.00'), Decimal('10.00')),
+            (573, 'Taken(5.0000)', Decimal('0.00'), Decimal('0.00'), Decimal('5.00')),
+            (644, 'Scheduled(1.0000)', Decimal('0.00'), Decimal('1.00'), Decimal('0.00')),
+            (644, 'Scheduled(3.0000)', Decimal('0.00'), Decimal('3.00'), Decimal('0.00')),
+            (784, 'Scheduled(3.0000)', Decimal('0.00'), Decimal('3.00'), Decimal('0.00')),
+            (785, 'Scheduled(3.0000)', Decimal('0.00'), Decimal('3.00'), Decimal('0.00'))])
+        reader = HrmMonthlyReader(filename=None, file_object=io.StringIO(self.hrm_monthly_data))
+        reader.use_staging_table = True
+        reader.load()
+        self.assertEqual(HrmMonthly.objects.get(employee__employee_number=153, status__startswith='Sch').status,
+                         'Scheduled(16.0000) Taken(20.0000)')
+        employee = Employee.objects.get(employee_number=153)
+        summary = Summarize(employee, date(2015, 8, 31))
+        self.assertEqual(summary.leave_days(date(2015, 8, 1), date(2015, 8, 31)), {
+            'pending_approval': Decimal('0.00'), 'scheduled': Decimal('16.00'), 'taken': Decimal('20.00')})
+        self.assertEqual(Summarize.leave_days_by_employee(date(2015, 8, 1), date(2015, 8, 31))[employee.pk],
+                         summary.leave_days(date(2015, 8, 1), date(2015, 8, 31)))
+        with self.assertNumQueries(1):
+            self.assertEqual(summary.monthly_taken(date(2015, 8, 1), date(2015, 8, 31)), Decimal('36.00'))
+        employees = Employees(date(2015, 1, 1), date(2015, 8, 31))
+        self.assertEqual(employees.leave_days(date(2015, 8, 1), date(2015, 8, 31)), [{
+            'pending_approval': Decimal('0.00'), 'scheduled': Decimal('36.00'), 'taken': Decimal('30.00')}])
+        self.assertEqual(employees.leave_days(date(2015, 8, 1), date(2015, 8, 31), by=['employee__location'])[0], {
+            'employee__location': 'CTU- Gaborone', 'pending_approval': Decimal('0.00'),
+            'scheduled': Decimal('16.00'), 'taken': Decimal('20.00')})
+        data = self.hrm_monthly_data.replace('Taken(5.0000) ,', 'Taken(5.0000) Cancelled(2.0000) ,')
+        HrmMonthlyReader(filename=None, file_object=io.StringIO(data)).load()
+        self.assertEqual(HrmMonthly.objects.get(employee__employee_number=573).status,
+                         'Taken(15.0000) Cancelled(2.0000)')
+
+    def test_backfill_status_components(self):
+        """Asserts the migration sets the components of rows with a status and leaves rows
+        loaded before the readers kept the status, which is empty, without components."""
+        HrmMonthlyReader(filename=None, file_object=io.StringIO(self.hrm_monthly_data)).load()
+        HrmMonthly.objects.update(status='', pending_approval=None, scheduled=None, taken=None)
+        HrmMonthly.objects.filter(employee__employee_number=153).update(
+            status='Scheduled(8.0000) Taken(10.0000) Cancelled(1.0000)')
+        migration = importlib.import_module('hrm.migrations.0005_hrmmonthly_status_components')
+        migration.backfill_status_components(apps, None)
+        self.assertEqual(HrmMonthly.objects.filter(status='', scheduled__isnull=True).count(), 5)
+        self.assertEqual(HrmMonthly.objects.filter(scheduled__isnull=False).values_list(
+            'employee__employee_number', 'pending_approval', 'scheduled', 'taken')[0],
+            (153, Decimal('0.00'), Decimal('8.00'), Decimal('10.00')))
+
+
+class TestVipMonthlyReader(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_vip_monthly_updates_hrm_vip_balance(self):
+        """Asserts VIP and opening balances are added to Hrm.vip_balance per employee in one
+        set-based update."""
+        csvfile = io.StringIO(self.hrm_usage_data)
+        HrmUsageReportReader(filename=None, month=8, year=2015, file_object=csvfile).load()
+        for month in [7, 8]:
+            csvfile = io.StringIO(self.vip_monthly_data)
+            reader = VipMonthlyReader(filename=None, month=month, year=2015, file_object=csvfile)
+            reader.load()
+        vip_balances = dict(Hrm.objects.values_list('employee__employee_number', 'vip_balance'))
+        self.assertEqual(vip_balances, {
+            573: Decimal('26.60'), 153: Decimal('6.34'), 784: Decimal('27.34'), 644: Decimal('0.00')})
+        self.load_openingbalances_from_file_object()
+        self.assertEqual(dict(Hrm.objects.values_list('employee__employee_number', 'vip_balance')), {
+            573: Decimal('44.90'), 153: Decimal('9.51'), 784: Decimal('41.01'), 644: Decimal('0.00')})
+        self.load_openingbalances_from_file_object()
+        self.assertEqual(Hrm.objects.get(employee__employee_number=153).vip_balance, Decimal('9.51'))
+
+
+class TestLoadReport(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_load_report(self):
+        """Asserts load() returns a report of the rows read, skipped, unresolved and written with
+        the time and queries of each stage, optionally profiled and logged as a JSON line."""
+        reader = HrmUsageReportReader(
+            filename=None, month=8, year=2015, file_object=io.StringIO(self.hrm_usage_data), batch_size=2)
+        log = io.StringIO()
+        report = reader.load(profile=True, log=log)
+        self.assertEqual((report.rows_read, report.rows_skipped, report.rows_unresolved, report.rows_written),
+                         (5, 0, 1, 4))
+        self.assertEqual(report.result, 4)
+        self.assertEqual(list(report.stages), ['pre_load', 'load_process', 'write', 'post_load'])
+        self.assertEqual(report.stages['write']['queries'], 2 * 3)
+        self.assertEqual(report.stages['post_load']['queries'], 1)
+        self.assertEqual(report.queries, sum(report.stages[name]['queries']
+                                             for name in ['pre_load', 'load_process', 'post_load']))
+        self.assertIn('write_batch', report.profile)
+        line = json.loads(log.getvalue())
+        self.assertEqual(line['reader'], 'HrmUsageReportReader')
+        self.assertEqual(line['rows_unresolved'], 1)
+        self.assertEqual(line['stages']['post_load']['queries'], 1)
+        reader = HrmMonthlyReader(filename=None, file_object=io.StringIO(self.hrm_monthly_data))
+        report = reader.load()
+        self.assertEqual((report.rows_read, report.rows_skipped, report.rows_unresolved, report.rows_written),
+                         (8, 2, 0, 6))
+        self.assertIsNone(report.profile)
+
+
+class TestLoadJournal(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def fail_after(self, method, calls):
+        """Returns `method` wrapped to raise RuntimeError once it has been called `calls` times."""
+        called = []
+
+        def wrapper(*args):
+            if len(called) >= calls:
+                raise RuntimeError('Interrupted')
+            called.append(args)
+            return method(*args)
+        return wrapper
+
+    def test_checkpointed_load_resumes(self):
+        """Asserts an interrupted checkpointed load resumes after the last committed chunk
+        without writing rows or adding balances twice."""
+        filename = os.path.join(self.path, 'hrm_usage201508.csv')
+        with open(filename, 'w') as f:
+            f.write(self.hrm_usage_data)
+        reader = HrmUsageReportReader(filename, 8, 2015)
+        reader.checkpoint = 2
+        reader.write_batch = self.fail_after(reader.write_batch, 1)
+        self.assertRaises(RuntimeError, reader.load)
+        self.assertEqual(Hrm.objects.count(), 2)
+        journal = LoadJournal.objects.get(reader='HrmUsageReportReader')
+        self.assertEqual((journal.rows_committed, journal.status), (2, LoadJournal.RUNNING))
+        reader = HrmUsageReportReader(filename, 8, 2015)
+        reader.checkpoint = 2
+        report = reader.load()
+        self.assertEqual(reader.resume_from, 2)
+        self.assertEqual((report.rows_read, report.rows_written), (3, 2))
+        self.assertEqual(Hrm.objects.count(), 4)
+        journal.refresh_from_db()
+        self.assertEqual((journal.rows_committed, journal.status), (5, LoadJournal.COMPLETE))
+        filename = os.path.join(self.path, 'vip201508.csv')
+        with open(filename, 'w') as f:
+            f.write(self.vip_monthly_data)
+        reader = VipMonthlyReader(filename, 8, 2015)
+        reader.checkpoint = 2
+        reader.write_totals = self.fail_after(reader.write_totals, 1)
+        self.assertRaises(RuntimeError, reader.load)
+        self.assertEqual(VipMonthly.objects.count(), 2)
+        reader = VipMonthlyReader(filename, 8, 2015)
+        reader.checkpoint = 2
+        reader.load()
+        self.assertEqual(reader.resume_from, 2)
+        self.assertEqual(dict(VipMonthly.objects.values_list('employee__employee_number', 'balance')), {
+            573: Decimal('13.30'), 153: Decimal('3.17'), 906: Decimal('4.17'), 784: Decimal('13.67')})
+        self.assertEqual(dict(Hrm.objects.values_list('employee__employee_number', 'vip_balance')), {
+            573: Decimal('13.30'), 153: Decimal('3.17'), 644: Decimal('0.00'), 784: Decimal('13.67')})
+        reader = VipMonthlyReader(filename, 8, 2015)
+        reader.checkpoint = 2
+        reader.open_journal()
+        self.assertEqual(reader.resume_from, 0)
+
+    def test_checkpoint_requires_one_job(self):
+        readers = [VipMonthlyReader(filename=None, month=8, year=2015, file_object=io.StringIO(self.vip_monthly_data))]
+        self.assertRaises(ValueError, load_readers, readers, jobs=2, checkpoint=2)
+        self.assertEqual(VipMonthly.objects.count(), 0)
+
+
+class TestLoadParallel(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+
+    def test_load_parallel_matches_serial(self):
+        """Asserts parsing periods in a process pool gives the same rows as loading them one by one."""
+        results = []
+        for jobs in [None, 2]:
+            VipMonthly.objects.all().delete()
+            HrmMonthly.objects.all().delete()
+            readers = [VipMonthlyReader(filename=None, month=month, year=2015,
+                                        file_object=io.StringIO(self.vip_monthly_data)) for month in [6, 7, 8]]
+            readers.append(HrmMonthlyReader(filename=None, file_object=io.StringIO(self.hrm_monthly_data)))
+            if jobs:
+                load_parallel(readers, jobs=jobs)
+            else:
+                for reader in readers:
+                    reader.load()
+            results.append((
+                list(VipMonthly.objects.order_by('employee', 'transaction_date').values_list(
+                    'employee', 'transaction_date', 'balance')),
+                list(HrmMonthly.objects.order_by('employee', 'transaction_date').values_list(
+                    'employee', 'transaction_date', 'balance')),
+                [reader.dirty for reader in readers],
+                [(reader.report.rows_read, reader.report.rows_skipped, reader.report.rows_written)
+                 for reader in readers]))
+        self.assertEqual(len(results[0][0]), 12)
+        self.assertEqual(results[0], results[1])
+
+
+class TestLoadAll(HrmTestCase):
+
+    def setUp(self):
+        self.path = self.write_export_files()
+
+    def write_export_files(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        files = {'employee.csv': self.employee_data, 'opening201412.csv': self.opening_balances,
+                 'hrm_usage201508.csv': self.hrm_usage_data, 'leave_list201508.csv': self.hrm_monthly_data}
+        for m, y in PERIODS:
+            files['vip{0}{1:02d}.csv'.format(y, m)] = self.vip_monthly_data
+        for filename, data in files.items():
+            with open(os.path.join(path, filename), 'w') as f:
+                f.write(data)
+        return path
+
+    def test_load_all(self):
+        """Asserts load_all loads every source and reports rows per stage."""
+        result = load_all(self.path, 2015, 8, jobs=2)
+        self.assertEqual(list(result.stages), ['employees', 'opening_balances', 'hrm_usage', 'leave_list', 'vip'])
+        self.assertEqual([stage.rows for stage in result.stages.values()], [8, 4, 5, 8, 36])
+        self.assertEqual(result.stages['employees'].result, 8)
+        self.assertEqual(VipMonthly.objects.all().count(), 36)
+        self.assertEqual(HrmMonthly.objects.all().count(), 6)
+        self.assertEqual(Hrm.objects.all().count(), 4)
+        self.assertEqual(len(result.dirty), 6)
+        self.assertLessEqual(sum(stage.elapsed for stage in result.stages.values()), result.elapsed)
+        self.assertFalse(any(hasattr(reader, 'stage_elapsed') for reader in result.readers))
+        call_command('load_hrm', self.path, jobs=2, stdout=io.StringIO())
+        self.assertEqual(VipMonthly.objects.all().count(), 36)
+        result = load_all(self.path, 2015, 8, jobs=2, force=True, use_staging_table=True)
+        self.assertEqual([stage.rows for stage in result.stages.values()], [8, 4, 5, 8, 36])
+        self.assertEqual(VipMonthly.objects.all().count(), 36)
+        self.assertEqual(HrmMonthly.objects.all().count(), 6)
+        self.assertEqual(Hrm.objects.all().count(), 4)
+
+    def balances(self):
+        return [
+            sorted(VipMonthly.objects.values_list('employee__employee_number', 'transaction_date', 'balance')),
+            sorted(HrmMonthly.objects.values_list(
+                'employee__employee_number', 'transaction_date', 'balance', 'status', 'taken')),
+            sorted(OpeningBalances.objects.values_list('employee__employee_number', 'balance')),
+            sorted(Hrm.objects.values_list('employee__employee_number', 'report_month', 'hrm_balance', 'vip_balance'))]
+
+    def test_load_all_reloads_replace_balances(self):
+        """Asserts forced and changed file reloads replace the balances loaded before
+        instead of adding to them."""
+        load_all(self.path, 2015, 8, sync=True)
+        balances = self.balances()
+        self.assertEqual(sum(balance for _, _, balance in balances[0]), 9 * Decimal('34.31'))
+        self.assertEqual(sum(balance for _, _, balance, _, _ in balances[1]), Decimal('39.00'))
+        self.assertEqual(balances[3][0], (153, date(2015, 8, 1), Decimal('11.00'), 10 * Decimal('3.17')))
+        for options in [{'sync': True}, {}, {'sync': True, 'use_staging_table': True}, {'jobs': 2}]:
+            load_all(self.path, 2015, 8, force=True, **options)
+            self.assertEqual(self.balances(), balances, options)
+        with open(os.path.join(self.path, 'hrm_usage201508.csv'), 'w') as f:
+            f.write(self.hrm_usage_data.replace('Bill Bruford,2015/11/30-2014/12/01,22,1,0,10,11,0',
+                                                'Bill Bruford,2015/11/30-2014/12/01,22,1,0,12,9,0'))
+        with open(os.path.join(self.path, 'vip201508.csv'), 'w') as f:
+            f.write(self.vip_monthly_data.replace('153,Mr B Bruford,3.17', '153,Mr B Bruford,4.17'))
+        result = load_all(self.path, 2015, 8, sync=True)
+        self.assertEqual([stage.rows for stage in result.stages.values()], [0, 0, 5, 0, 4])
+        balances[0][balances[0].index((153, date(2015, 8, 31), Decimal('3.17')))] = (
+            153, date(2015, 8, 31), Decimal('4.17'))
+        balances[3][0] = (153, date(2015, 8, 1), Decimal('9.00'), 10 * Decimal('3.17') + 1)
+        self.assertEqual(self.balances(), balances)
+
+    def test_load_all_skips_unchanged_files(self):
+        """Asserts files are loaded again only when changed or forced."""
+        load_all(self.path, 2015, 8, sync=True)
+        self.assertEqual(FileRegistry.objects.count(), 4 + len(PERIODS))
+        entry = FileRegistry.objects.get(reader='VipMonthlyReader', key='2015-08-01')
+        self.assertEqual(fingerprint(entry.filename), (entry.size, entry.mtime, entry.sha256))
+        self.assertEqual((entry.rows_read, entry.rows_written), (4, 4))
+        self.assertEqual(json.loads(entry.result)['reader'], 'VipMonthlyReader')
+        self.assertEqual(load_all(self.path, 2015, 8, sync=True).rows, 0)
+        filename = os.path.join(self.path, 'leave_list201508.csv')
+        with open(filename, 'w') as f:
+            f.write(self.hrm_monthly_data)
+        os.utime(filename, (0, 0))
+        self.assertEqual(load_all(self.path, 2015, 8, sync=True).rows, 0)
+        self.assertEqual(FileRegistry.objects.get(filename=filename).mtime, 0)
+        with open(filename, 'a') as f:
+            f.write(self.hrm_monthly_data.splitlines()[1] + '\n')
+        result = load_all(self.path, 2015, 8, sync=True)
+        self.assertEqual([stage.rows for stage in result.stages.values()], [0, 0, 0, 9, 0])
+        with open(os.path.join(self.path, 'hrm_usage201508.csv'), 'w') as f:
+            f.write(self.hrm_usage_data.replace('Rick Wakeman,2015/11/30-2014/12/01,22,0,0,0,22',
+                                                'Rick Wakeman,2015/11/30-2014/12/01,22,0,0,1,21'))
+        result = load_all(self.path, 2015, 8, sync=True)
+        self.assertEqual([stage.rows for stage in result.stages.values()], [0, 0, 5, 0, 0])
+        result = load_all(self.path, 2015, 8, sync=True, force=True)
+        self.assertEqual([stage.rows for stage in result.stages.values()], [8, 4, 5, 9, 36])
+
+
+class TestBalanceCube(HrmTestCase):
+
+    def setUp(self):
+        self.load_employees_from_file_object()
+        csvfile = io.StringIO(self.opening_balances)
+        OpeningBalancesReader(filename=None, balance_date=date(2014, 12, 31), file_object=csvfile).load()
+
+    def test_summarize_all(self):
+        """Asserts summarize_all uses a fixed number of queries and matches Summarize per employee."""
+        self.load_hrm_from_file_object(self.bruford_hrm_monthly_data)
+        self.load_hrm_from_file_object()
+        reference_date = date(2015, 8, 31)
+        with self.assertNumQueries(3):
+            summaries, missing = Summarize.summarize_all(reference_date, date(2014, 12, 31))
+            results = {employee_number: (summary.balance_from_opening, summary.balance_for_leave_period)
+                       for employee_number, summary in summaries.items() if isinstance(summary, Summarize)}
+        self.assertEqual(sorted(results), [153, 573, 784, 906])
+        self.assertEqual(sorted(missing), [55, 644, 785])
+        for employee_number, balances in results.items():
+            summary = Summarize(Employee.objects.get(employee_number=employee_number), reference_date)
+            self.assertEqual(balances, (summary.balance_from_opening, summary.balance_for_leave_period))
+        self.assertEqual(results[153][0], Decimal('3.17') + Decimal('16.64') - Decimal('36.50'))
+
+    def test_balance_cube(self):
+        """Asserts the balance cube writes monthly running balances that agree with Summarize."""
+        self.load_hrm_from_file_object(self.bruford_hrm_monthly_data)
+        self.load_vip_from_file_object()
+        cube = BalanceCube(date(2014, 12, 1), date(2015, 8, 31))
+        self.assertEqual(cube.balance.shape, (8, 9))
+        self.assertEqual(cube.write(), 8 * 9 - 5)
+        bruford = Employee.objects.get(employee_number=153)
+        balances = Balances.objects.get(employee=bruford, balance_date=date(2015, 8, 31))
+        self.assertEqual(balances.balance, Summarize(bruford, date(2015, 8, 31)).balance_from_opening)
+        self.assertEqual(balances.accrued, Decimal('16.64'))
+        self.assertEqual(balances.taken, Decimal('18.50'))
+        self.assertEqual(balances.vip_balance, Decimal('3.17'))
+        self.assertEqual(Balances.objects.get(employee=bruford, balance_date=date(2015, 3, 31)).balance,
+                         Decimal('3.17') + Decimal('6.24') - Decimal('9.50'))
+        white = Employee.objects.get(employee_number=731)
+        self.assertEqual(Balances.objects.filter(employee=white).count(), 4)
+        self.assertEqual(cube.write(date(2015, 6, 1)), 7 * 3)
+        self.assertEqual(Balances.objects.all().count(), 8 * 9 - 5)
+
+    def test_recompute_dirty_balances(self):
+        """Asserts only employees changed by a load are recomputed and the result matches a full run."""
+        start_date, end_date = date(2014, 12, 1), date(2015, 8, 31)
+        BalanceCube(start_date, end_date).write()
+        csvfile = io.StringIO(self.bruford_hrm_monthly_data)
+        reader = HrmMonthlyReader(filename=None, file_object=csvfile)
+        reader.load()
+        bruford = Employee.objects.get(employee_number=153)
+        self.assertEqual(reader.dirty, {bruford.pk: date(2015, 1, 1)})
+        self.assertEqual(recompute(reader.dirty, start_date, end_date), 8)
+        recomputed = list(Balances.objects.order_by('employee', 'balance_date').values_list(
+            'employee', 'balance_date', 'balance', 'taken'))
+        BalanceCube(start_date, end_date).write()
+        self.assertEqual(recomputed, list(Balances.objects.order_by('employee', 'balance_date').values_list(
+            'employee', 'balance_date', 'balance', 'taken')))
+
+    def test_recompute_replaced_and_opening_balances(self):
+        """Asserts a reload marks the employees of the rows it deletes, opening balances mark
+        the whole cube and recompute then matches a full run."""
+        start_date, end_date = date(2014, 12, 1), date(2015, 8, 31)
+        balances = lambda: list(Balances.objects.order_by('employee', 'balance_date').values_list(
+            'employee', 'balance_date', 'balance', 'vip_balance'))
+        pks = dict(Employee.objects.values_list('employee_number', 'pk'))
+        self.load_vip_from_file_object()
+        BalanceCube(start_date, end_date).write()
+        data = self.vip_monthly_data.replace('153,Mr B Bruford,3.17\n', '')
+        reader = VipMonthlyReader(filename=None, month=8, year=2015, file_object=io.StringIO(data))
+        reader.load()
+        self.assertEqual(reader.dirty[pks[153]], date(2015, 8, 1))
+        recompute(reader.dirty, start_date, end_date)
+        recomputed = balances()
+        BalanceCube(start_date, end_date).write()
+        self.assertEqual(recomputed, balances())
+        data = self.opening_balances.replace('573,Moraz,Pat, 14/2/11, 18.3', '573,Moraz,Pat, 14/2/11, 20.3')
+        reader = OpeningBalancesReader(filename=None, balance_date=date(2014, 12, 31), file_object=io.StringIO(data))
+        reader.load()
+        self.assertEqual(reader.dirty[pks[573]], date.min)
+        recompute(reader.dirty, start_date, end_date)
+        recomputed = balances()
+        BalanceCube(start_date, end_date).write()
+        self.assertEqual(recomputed, balances())
@@ -0,0 +1,64 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.db import connection
+from django.test.testcases import TestCase
+
+from hrm.models import Employee, Hrm, HrmMonthly, VipMonthly
+from hrm.reports import Employees
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite only.')
+class TestIndexes(TestCase):
+    """Asserts SQLite searches an index, rather than scanning the table, for each hot query."""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(
+            employee_number=573, lastname='Moraz', firstname='Patrick', joined=date(2011, 2, 14))
+        self.employees = Employees.__new__(Employees)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoTableScan(self, queryset):
+        plan = self.query_plan(queryset)
+        self.assertFalse([detail for detail in plan if detail.startswith('SCAN')], plan)
+
+    def test_strippedname(self):
+        """Name resolution falls back to the stripped name."""
+        self.assertNoTableScan(Employee.objects.filter(strippedname='PatrickMoraz'))
+
+    def test_monthly_by_employee_and_period(self):
+        """BaseMonthlyReader.update_model gets the row of an employee, period and transaction date."""
+        for model in [HrmMonthly, VipMonthly]:
+            self.assertNoTableScan(model.objects.filter(
+                employee=self.employee,
+                leave_period_start=date(2015, 8, 1),
+                leave_period_end=date(2015, 8, 31),
+                transaction_date=date(2015, 8, 31)))
+
+    def test_monthly_taken(self):
+        """Summarize.monthly_taken sums an employee's rows within a period."""
+        self.assertNoTableScan(HrmMonthly.objects.filter(
+            employee=self.employee,
+            leave_period_start__gte=date(2014, 12, 1),
+            leave_period_end__lte=date(2015, 8, 31)))
+
+    def test_monthly_by_transaction_date(self):
+        """BaseMonthlyReader.write_totals and the export read the rows of transaction dates."""
+        for model in [HrmMonthly, VipMonthly]:
+            self.assertNoTableScan(model.objects.filter(transaction_date__in=[date(2015, 7, 31), date(2015, 8, 31)]))
+
+    def test_hrm_by_report_month(self):
+        """HrmUsageReportReader.report_rows are replaced on every load."""
+        self.assertNoTableScan(Hrm.objects.filter(report_month=date(2015, 8, 1)))
+
+    def test_employees_by_date(self):
+        """reports.Employees range scans joined and termination_date."""
+        start_date, end_date = date(2015, 1, 1), date(2015, 1, 31)
+        self.assertNoTableScan(self.employees.joined_in_period(start_date, end_date))
+        self.assertNoTableScan(self.employees.terminated_in_period(start_date, end_date))
+        self.assertNoTableScan(self.employees.active_employees(end_date))
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+
+from collections import OrderedDict
+from datetime import date
+
+from django.test.testcases import TestCase
+
+from hrm.instrumentation import QueryCounter
+from hrm.load import (
+    employee_reader, opening_balances_reader, hrm_usage_readers, hrm_monthly_readers, vip_monthly_readers)
+from hrm.models import Employee, Hrm, HrmMonthly, OpeningBalances, VipMonthly
+from hrm.summary import Summarize
+from hrm.synthetic import SyntheticData
+
+SIZES = [100, 1000]
+
+# (fixed queries, rows per query) so a step runs exactly fixed + ceil(rows / rows per query) queries.
+# Rows per query is the synthetic rows a step reads per batched query, bounded by the rows SQLite takes
+# in one bulk insert under its 999 parameter limit. A query per row, or per batch more, fails the budget.
+BUDGETS = OrderedDict([
+    ('employees', (4, 80)),
+    ('opening_balances', (6, 200)),
+    ('hrm_usage', (7, 65)),
+    ('leave_list', (7, 90)),
+    ('vip', (7, 70)),
+    ('summarize_all', (3, None)),
+])
+
+
+class TestQueryBudget(TestCase):
+    """Loads synthetic files at each of SIZES and fails if a step's queries differ from its
+    budget in BUDGETS."""
+
+    counts = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        path = tempfile.mkdtemp()
+        try:
+            for rows in SIZES:
+                cls.counts[rows] = cls.measure(rows, path)
+        finally:
+            shutil.rmtree(path)
+
+    @classmethod
+    def measure(cls, rows, path):
+        for model in [VipMonthly, HrmMonthly, Hrm, OpeningBalances, Employee]:
+            model.objects.all().delete()
+        data = SyntheticData(rows, seed=rows)
+        data.write(path)
+        steps = OrderedDict([
+            ('employees', employee_reader(path, sync=True).load),
+            ('opening_balances', opening_balances_reader(path).load),
+            ('hrm_usage', hrm_usage_readers(path)[0].load),
+            ('leave_list', hrm_monthly_readers(path, [(8, 2015)])[0].load),
+            ('vip', vip_monthly_readers(path, [(8, 2015)])[0].load),
+            ('summarize_all', lambda: Summarize.summarize_all(date(2015, 8, 1), data.opening_date)),
+        ])
+        counts = {}
+        for name, step in steps.items():
+            with QueryCounter() as queries:
+                step()
+            counts[name] = queries.count
+        return counts
+
+    def assertWithinBudget(self, name):
+        fixed, rows_per_query = BUDGETS[name]
+        for rows in SIZES:
+            budget = fixed + (-(-rows // rows_per_query) if rows_per_query else 0)
+            self.assertEqual(
+                self.counts[rows][name], budget,
+                '{} ran {} queries for {} rows. Budget is {}.'.format(name, self.counts[rows][name], rows, budget))
+
+    def test_employee_reader_budget(self):
+        self.assertWithinBudget('employees')
+
+    def test_opening_balances_reader_budget(self):
+        self.assertWithinBudget('opening_balances')
+
+    def test_hrm_usage_reader_budget(self):
+        self.assertWithinBudget('hrm_usage')
+
+    def test_hrm_monthly_reader_budget(self):
+        self.assertWithinBudget('leave_list')
+
+    def test_vip_monthly_reader_budget(self):
+        self.assertWithinBudget('vip')
+
+    def test_summarize_all_budget(self):
+        self.assertWithinBudget('summarize_all')
+        self.assertEqual(self.counts[SIZES[0]]['summarize_all'], self.counts[SIZES[-1]]['summarize_all'])
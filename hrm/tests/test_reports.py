@@ -0,0 +1,150 @@
+import io
+import csv
+
+from datetime import date, datetime
+from decimal import Decimal
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
+from django.test.testcases import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from hrm.admin import EstimatedCountPaginator, HrmAdmin, estimated_count
+from hrm.export import HEADER, export_rows
+from hrm.models import Hrm, VipMonthly
+from hrm.readers import EmployeeReader, HrmUsageReportReader, VipMonthlyReader
+from hrm.reports import Employees, Headcount
+from hrm.tests import test_hrm
+
+
+class TestReports(TestCase):
+
+    def setUp(self):
+        EmployeeReader(filename=None, file_object=io.StringIO(test_hrm.TestHrm.employee_data)).load()
+        HrmUsageReportReader(
+            filename=None, month=8, year=2015,
+            file_object=io.StringIO(test_hrm.TestHrm.hrm_usage_data)).load()
+        for month in [7, 8]:
+            VipMonthlyReader(
+                filename=None, month=month, year=2015,
+                file_object=io.StringIO(test_hrm.TestHrm.vip_monthly_data)).load()
+
+    def test_export_rows(self):
+        """Asserts the reconciliation export is one query with the diff columns computed in SQL."""
+        with self.assertNumQueries(1):
+            rows = list(export_rows(date(2015, 8, 31)))
+        self.assertEqual(rows[0], HEADER)
+        rows = {row[0]: row for row in rows[1:]}
+        self.assertEqual(sorted(rows), [153, 573, 784])
+        self.assertEqual(rows[573][5], '2014-12-01 - 2015-11-30')
+        self.assertEqual(rows[573][12:], [
+            Decimal('15.00'), Decimal('26.60'), Decimal('1.70'), Decimal('1.70'), None, None])
+        self.assertEqual(rows[153][12:], [
+            Decimal('11.00'), Decimal('6.34'), Decimal('7.83'), Decimal('7.83'), None, Decimal('7.83')])
+        self.assertEqual(rows[784][12:], [
+            Decimal('14.50'), Decimal('27.34'), Decimal('0.83'), Decimal('0.83'), None, None])
+        self.assertEqual(len(list(export_rows())), 4)
+
+    def test_export_view_streams(self):
+        """Asserts the admin export view streams the same rows as csv."""
+        request = RequestFactory().get('/admin/hrm/hrm/export/', {'transaction_date': '2015-08-31'})
+        response = HrmAdmin(Hrm, admin.site).export_view(request)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], HEADER)
+        self.assertEqual(len(rows), 4)
+
+    def test_export_view_rejects_invalid_date(self):
+        for value in ['31/08/2015', '2015-02-30', "2015-08-31' OR 1=1"]:
+            request = RequestFactory().get('/admin/hrm/hrm/export/', {'transaction_date': value})
+            self.assertEqual(HrmAdmin(Hrm, admin.site).export_view(request).status_code, 400)
+
+
+class TestHeadcount(TestCase):
+
+    def setUp(self):
+        EmployeeReader(filename=None, file_object=io.StringIO(test_hrm.TestHrm.employee_data)).load()
+
+    def test_headcount_matches_count_queries(self):
+        """Asserts joined, terminated and active per period match the per-period count queries in one query."""
+        employees = Employees.__new__(Employees)
+        for granularity in ['month', 'quarter', 'year']:
+            with self.assertNumQueries(1):
+                headcount = Headcount.for_range(date(2011, 1, 15), date(2015, 6, 30), granularity)
+            self.assertEqual(headcount.periods[0][0], date(2011, 1, 1))
+            for i, (start, end) in enumerate(headcount.periods):
+                self.assertEqual(headcount.joined[()][i], employees.joined_in_period(start, end).count())
+                self.assertEqual(headcount.terminated[()][i], employees.terminated_in_period(start, end).count())
+                self.assertEqual(headcount.active[()][i], employees.active_employees(end).count())
+        self.assertEqual(headcount.active[()], [3, 4, 7, 8, 7])
+
+    def test_headcount_by_location(self):
+        headcount = Headcount.for_range(date(2015, 1, 1), date(2015, 12, 31), 'year', by=['location'])
+        rows = {row['location']: row for row in headcount.rows()}
+        self.assertEqual(rows['MPEPU']['active'], 3)
+        self.assertEqual(rows['CTU- Molepolole ']['terminated'], 1)
+        self.assertEqual(sum(row['active'] for row in rows.values()), 7)
+
+    def test_employees_joined_and_terminated(self):
+        with self.assertNumQueries(1):
+            employees = Employees(datetime(1900, 1, 1), date(2014, 11, 30))
+        self.assertEqual(employees.total, 8)
+        self.assertEqual(employees.joined[0], (date(2014, 11, 1), 8))
+        self.assertEqual(employees.terminated[4], (date(2015, 3, 1), 1))
+        self.assertEqual(len(employees.joined), 10)
+
+
+class TestAdmin(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        EmployeeReader(filename=None, file_object=io.StringIO(test_hrm.TestHrm.employee_data)).load()
+
+    def load_vip(self, months):
+        for month in months:
+            VipMonthlyReader(
+                filename=None, month=month, year=2015,
+                file_object=io.StringIO(test_hrm.TestHrm.vip_monthly_data)).load()
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Asserts the employee is joined in the page query and filter choices are cached."""
+        url = '/admin/hrm/vipmonthly/'
+        self.load_vip([8])
+        self.changelist_queries(url)
+        queries = self.changelist_queries(url)
+        self.load_vip([5, 6, 7])
+        self.assertEqual(self.changelist_queries(url), queries)
+        self.assertLessEqual(self.changelist_queries(url + '?location=MPEPU'), queries)
+        response = self.client.get(url + '?location=MPEPU&transaction_date__year=2015')
+        self.assertEqual(response.context['cl'].result_count, 8)
+
+    def test_estimated_count(self):
+        """Asserts unfiltered changelists above the threshold use the estimated count and
+        that tables without statistics are counted exactly after rows are loaded again."""
+        self.load_vip([6, 7, 8])
+        self.load_vip([8, 8])
+        queryset = VipMonthly.objects.all()
+        self.assertGreater(queryset.order_by('-pk')[0].pk, 12)
+        self.assertEqual(estimated_count(VipMonthly), 12)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_count(VipMonthly), 12)
+        EstimatedCountPaginator.threshold, threshold = 10, EstimatedCountPaginator.threshold
+        try:
+            with self.assertNumQueries(2):
+                self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 12)
+            with self.assertNumQueries(1):
+                self.assertEqual(EstimatedCountPaginator(
+                    queryset.filter(employee__location='MPEPU'), 100).count, 6)
+        finally:
+            EstimatedCountPaginator.threshold = threshold
@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+# keep each statement under SQLite's default limit of 999 bound parameters
+MAX_PARAMS = 900
+
+
+def bulk_update(objs, fields, batch_size=None):
+    """Writes `fields` of already saved instances with one UPDATE ... CASE statement per batch.
+
+    Returns the number of rows updated."""
+    objs = list(objs)
+    if not objs or not fields:
+        return 0
+    model = objs[0].__class__
+    model_fields = [model._meta.get_field(name) for name in fields]
+    batch_size = batch_size or max(1, MAX_PARAMS // (2 * len(model_fields) + 1))
+    updated = 0
+    with transaction.atomic():
+        for i in range(0, len(objs), batch_size):
+            batch = objs[i:i + batch_size]
+            values = {}
+            for field in model_fields:
+                values[field.name] = Case(
+                    *[When(pk=obj.pk, then=Value(getattr(obj, field.attname), output_field=field))
+                      for obj in batch],
+                    output_field=field)
+            updated += model.objects.filter(pk__in=[obj.pk for obj in batch]).update(**values)
+    return updated
+